@@ -12,24 +12,24 @@ newspaper.
 import sys
 import os
 import json
-import pandas as pd
 from .analysis_helpers import write_to_json, unique_list
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from utilities.data_retrieval import search_strings
+from utilities.clean_parquet import read_mentions
 
 
 def retrieve_total_article_counts():
     """
-    Reads in a JSON file of cleaned articles and calculates various article counts. 
+    Reads the cleaned articles from the clean parquet files and calculates various article counts. 
     Calculates the total number of articles, the number of unique articles, 
     and the number of articles for each newspaper and candidate.
     Writes the article counts to separate JSON files.
     """
 
-    df = pd.read_json('databased/data/clean_articles.json')
+    df = read_mentions(["candidate_id", "newspaper_id", "url"])
 
     dataframe_size = len(df)
     unique_art_count = len(df.loc[:,["url"]].drop_duplicates())
@@ -16,7 +16,6 @@ nltk.download('vader_lexicon')
 import sys
 import os
 import json
-import pandas as pd
 from nltk.corpus import stopwords
 from nltk.sentiment import SentimentIntensityAnalyzer
 from .analysis_helpers import single_text_str, write_to_json, unique_list
@@ -25,6 +24,7 @@ current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from utilities.data_retrieval import search_strings
+from utilities.clean_parquet import read_mentions, read_articles
 
 
 def basic_sentence_sentiment():
@@ -38,7 +38,7 @@ def basic_sentence_sentiment():
         - The third dictionary contains the respective sentiment scores for each unique candidate-newspaper pair.
     
     """
-    df = pd.read_json('databased/data/clean_articles.json')
+    df = read_mentions(["candidate_id", "newspaper_id", "url", "clean_sentences"])
     sia = SentimentIntensityAnalyzer()
     
     # cand_by_newspaper_sentiment takes about 30 seconds
@@ -51,7 +51,8 @@ def basic_sentence_sentiment():
     write_to_json("sentiment.json", cand_by_newspaper_sentiment)
 
     # news_sentiment takes about 35 minutes
-    news_sentiment = sentence_sentiment_single_token(sia, df, "newspaper_id", "clean_text")
+    articles = read_articles(["newspaper_id", "url", "clean_text"])
+    news_sentiment = sentence_sentiment_single_token(sia, articles, "newspaper_id", "clean_text")
     write_to_json("bs_news.json", news_sentiment)
 
 
@@ -11,7 +11,6 @@ Finds and the most frequent words associated with a candidates and newspapers.
 # nltk.download("stopwords")
 import sys
 import os
-import pandas as pd
 from collections import Counter
 from nltk.corpus import stopwords
 from .analysis_helpers import single_text_str, write_to_json, unique_list
@@ -19,10 +18,11 @@ from .analysis_helpers import single_text_str, write_to_json, unique_list
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
+from utilities.clean_parquet import read_mentions, read_articles
 
 def most_frequent():
     """
-    Reads in a JSON file containing cleaned article data (change), and calculates 
+    Reads the cleaned article data from the clean parquet files, and calculates 
     the most frequent words in the text data for each candidate and each newspaper source, 
     as well as the most frequent words overall for candidates within newspapers.
 
@@ -32,8 +32,7 @@ def most_frequent():
             A dictionary corrisponding to the most frequent words in the text data for each newspaper
             A dictionary corrisponding to the most frequent words in the text data for each candidates within newspapers
     """
-    # will probably have to read in as data base
-    df = pd.read_json('databased/data/clean_articles.json')
+    df = read_mentions(["candidate_id", "newspaper_id", "url", "clean_sentences"])
     
     # Additional words that should not be included in the most frequent word count
     cand_stopwords = ['kambium', 'elijah', 'kam', 'buckner', 'jesús', 'jesus',
@@ -47,7 +46,8 @@ def most_frequent():
     cand_word_freq = calc_most_frequent_single(df, "candidate_id", cand_stopwords, "clean_sentences")
     write_to_json("word_freq_candidate.json", cand_word_freq)
 
-    news_word_freq = calc_most_frequent_single(df, "newspaper_id", news_stopwords, "clean_text")
+    articles = read_articles(["newspaper_id", "url", "clean_text"])
+    news_word_freq = calc_most_frequent_single(articles, "newspaper_id", news_stopwords, "clean_text")
     write_to_json("word_freq_news.json", news_word_freq)
 
     cand_by_news_freq = calc_most_frequent_double(df, cand_stopwords)
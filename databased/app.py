@@ -12,11 +12,7 @@ import sys
 from textwrap import dedent
 
 # Scrapers
-from databased.scrapers.defender import defender_scrape
-from databased.scrapers.scrape_lawndale import ln_scrape
-from databased.scrapers.hph_scraper import hph_scrape
-from databased.scrapers.tribune_crain_select import run_selection
-from databased.scrapers.triibe import triibe_scrape
+from databased.scrapers.orchestrator import run_all
 
 # Data Cleaning
 from databased.cleaning.clean import export_clean
@@ -74,7 +70,7 @@ def render_project():
    
     # Scrape command
     elif user_input == 2:
-        run_scrapers()
+        run_scrapers(ask_incremental())
         ask_continue()
     
     # Clean command
@@ -92,7 +88,7 @@ def render_project():
     elif user_input == 5:
         print("\nExecuting Entire Project")
 
-        run_scrapers()
+        run_scrapers(ask_incremental())
 
         print("\nCleaning Data:")
         export_clean()
@@ -128,24 +124,17 @@ def run_analysis():
     basic_sentence_sentiment()
 
 
-def run_scrapers():
+def run_scrapers(incremental=False):
     """
-    Executes all newpaper scrapers and APIs.
-    """
-    print("\nScraping the Chicago Defender:")
-    defender_scrape()
-    
-    print("\nScraping the Hyde Park Herald:")
-    hph_scrape() 
-
-    print("\nScraping Lawndale News:")
-    ln_scrape()
-
-    print("\nScraping The TRiiBE:")
-    triibe_scrape()
+    Executes all newpaper scrapers and APIs at the same time.
 
-    print("\nAccessing APIs of the Chicago Tribune and Crain's Chicago Business:")
-    run_selection()
+    Inputs:
+        incremental (bool): if True, newspaper scrapers only fetch articles
+            published since their last run and append them to their output
+    """
+    print("\nScraping all newspapers and the APIs of the Chicago Tribune and "
+          "Crain's Chicago Business in parallel:")
+    run_all(incremental=incremental)
 
 def close_project():
     """
@@ -155,6 +144,25 @@ def close_project():
     print("\n********************************************************************************************************************************\n")
    
 
+def ask_incremental():
+    """
+    Prompts user if the newspaper scrapers should only fetch articles published
+    since their last run
+
+    Returns:
+        True for an incremental scrape, False for a full one
+    """
+    user_input = input("\nOnly scrape articles published since the last run (y/n): ")
+
+    if user_input == 'y':
+        return True
+    elif user_input == 'n':
+        return False
+    else:
+        print("\nERROR! Unrecognized User Input. Please input the singular letter of your desired command and press enter.")
+        return ask_incremental()
+
+
 def ask_continue():
     """
     Prompts user if they would like to execute another portion of the project
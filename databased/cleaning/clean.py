@@ -6,26 +6,27 @@ File name: clean.py
 Associated files: None
 Author: Kathryn Link-Oberstar
 
-Clean JSON files of scraped articles and return two JSON files with a list of
-clean article dictionaries.
+Clean JSON files of scraped articles and store the clean articles for analysis.
 
-clean_articles.json returns a deduplicated list of dictionaries of articles used
-for analysis with the following keys:
-    * "candidate_id"
-    * "name_tokens"
-    * "announcement_date"
-    * "newspaper_id"
-    * "url"
-    * "date"
-    * "title"
-    * "text"
-    * "clean_title"
-    * "clean_text"
-    * "clean_sentences"
+The articles are loaded into the article store (data/articles.db, see
+utilities/article_store.py), which keeps each article's text once along with a
+mention row for each candidate it mentions, and drops duplicate (candidate,
+article) records. Each article is then cleaned once, adding:
+    * "clean_title" and "clean_text" to the article
+    * "clean_sentences" to each of its mentions
+The cleaned mentions and articles are then exported to data/clean_mentions.parquet
+and data/clean_articles.parquet (see utilities/clean_parquet.py), which analysis
+reads through clean_parquet.read_mentions and clean_parquet.read_articles.
+
+The scraped files are read a record at a time, articles are cleaned a chunk at
+a time and both JSON exports are written a row at a time, so memory use does
+not grow with the size of the corpus; the store itself lives on disk.
 
-clean_articles_abr.json is an abridged version of clean_article.json that
-is about half the size, and is easier to open and read. Article dictionaries
-contain the following keys:
+clean_articles.json is a full export of the store, with one dictionary per
+(candidate, article) holding every article and mention column, for readers
+of the file. clean_articles_abr.json is an abridged, human readable export of
+the store with one dictionary per (candidate, article) containing the
+following keys:
     * "candidate_id"
     * "name_tokens"
     * "announcement_date"
@@ -41,15 +42,20 @@ Must run !python3 -m pip install nltk and nltk.download("stopwords")
 import nltk
 nltk.download("stopwords")
 import sys
-import re
 import os
-import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from nltk.corpus import stopwords
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
+from utilities.jsonl_sink import stream_articles, write_json_records
+from utilities import article_store
+from utilities import clean_cache
+from utilities import clean_parquet
+from cleaning.tokenizer import Cleaner
 
 # Define and format stopwords
 additional_stop_words =  ['000', 'ald', 'alderman', 'aldermen', 'ald.', 'also', 
@@ -63,7 +69,7 @@ additional_stop_words =  ['000', 'ald', 'alderman', 'aldermen', 'ald.', 'also',
 
 standard_stop_words = stopwords.words('english')
 standard_stop_words.extend(additional_stop_words)
-STOP_WORDS = r'\b('+'|'.join(standard_stop_words)+r')\b'
+CLEANER = Cleaner(standard_stop_words)
 
 # Create dictionary of candidate name tokens
 clean_name_tokens = pd.read_csv(sys.path[-1] + '/data/cleaning_name_tokens.csv')
@@ -71,63 +77,241 @@ CAND_NAME_TOKENS = (clean_name_tokens.groupby('candidate_id')['name_tokens']
                     .apply(lambda x: [token.lower().strip() for token in set(x)])
                     .to_dict())
 
-def export_clean():
+ABRIDGED_COLUMNS = ["candidate_id", "name_tokens", "announcement_date",
+                    "newspaper_id", "url", "date", "clean_title", "clean_sentences"]
+
+def export_clean(max_workers=None):
     '''
-    Reads article data from multiple JSON files, cleans and de-duplicates the
-    data, and writes the cleaned data to two JSON files on disk, a full version
-    for analysis, and an abridged file that is more easily human readable.
+    Reads article data from multiple JSON files into the article store, which
+    de-duplicates the data, cleans every article in the store, and writes the
+    cleaned data to two JSON files on disk, a full version and an abridged
+    file that is more easily human readable.
 
     Inputs:
-        None
+        max_workers (int): number of cleaning processes, one per core by
+            default; 1 cleans the articles in this process
 
     Outputs:
-        None. Writes clean_articles.json and clean_articles_abr.json
-            to the data folder.
+        None. Writes articles.db, clean_mentions.parquet,
+            clean_articles.parquet, clean_articles.json and
+            clean_articles_abr.json to the data folder.
     '''
     papers = ["/data/crain.json", "/data/chicago_tribune.json",
               "/data/defender.json", "/data/hph.json","/data/ln.json",
               "/data/triibe.json"]
 
-    all_articles = []
+    connection = article_store.create_store()
+    row_order = 0
     for paper in papers:
-        all_articles += clean(paper)
+        articles = stream_articles(sys.path[-1] + paper)
+        row_order = article_store.add_records(connection, articles, row_order)
 
-    article_df = pd.DataFrame(all_articles)
-    dedupe_df = article_df.drop_duplicates(subset = ['candidate_id', 'url'],
-                                keep = 'last').reset_index(drop = True)
+    print("Cleaning articles")
+    clean(connection, max_workers)
+    connection.close()
 
-    # Clean files for analysis
+    print("Writing clean_mentions.parquet and clean_articles.parquet")
+    clean_parquet.export_parquet()
+
+    # Full clean file
     print("Writing clean_articles json")
     filepath = sys.path[-1] + '/data/clean_articles.json'
-    dedupe_df.to_json(filepath, orient='records')
+    write_json_records(article_store.iter_mentions(article_store.ALL_COLUMNS),
+                       filepath)
 
     # Abridged clean file that is human readable
     print("Writing clean_articles_abridged.json")
     filepath_abr = sys.path[-1] + '/data/clean_articles_abr.json'
-    dedupe_df_drop = dedupe_df.drop(['title','text','clean_text'], axis = 1)
-    dedupe_df_drop.to_json(filepath_abr, orient= 'records')
+    write_json_records(article_store.iter_mentions(ABRIDGED_COLUMNS), filepath_abr)
 
-def clean(filepath):
+def clean(connection, max_workers=None, chunk_size=article_store.BATCH_SIZE):
     '''
-    This function takes the filepath of a JSON file containing a list of
-    article dictionaries to clean. It returns an updated list of article
-    dictionaries, where three additional keys have been added:
+    This function cleans every article in the article store, adding:
         * clean_title: title, lowercase, remove stop words, remove
             non-alphanumeric charachters
         * clean_text: text, lowercase, remove stop words, remove non-alphanumeric
             charachters except for end of sentance punctuation
-        * clean_sentences:concatenated string of cleaned sentences containing
-            candidate names.
+        * clean_sentences: for each candidate the article mentions,
+            concatenated string of cleaned sentences containing the
+            candidate's names.
+
+    Titles and texts are cleaned through the clean cache, so a title or text
+    cleaned before, in this run or an earlier one, is not cleaned again.
+
+    Articles are cleaned a chunk at a time in a pool of worker processes, each
+    of which builds its stop word tables once, when it starts. A title or text
+    is sent to a worker only the first time it is read; later articles with
+    the same one wait for that first result. Chunks are saved in the order
+    they were read, so the result is the same whatever the number of workers.
+
+    Inputs:
+        connection (sqlite3.Connection): the open article store
+        max_workers (int): number of worker processes, one per core by
+            default; 1 cleans the articles in this process
+        chunk_size (int): number of articles sent to a worker at once
+    '''
+    cache = clean_cache.connect()
+    pending = set()
+    cleaned = 0
+    fields = 0
+    with connection, cache:
+        chunks = read_chunks(connection, cache, chunk_size, pending)
+        for chunk in clean_chunks(chunks, max_workers):
+            for article in chunk:
+                for digest, clean_str in article['new_clean'].items():
+                    clean_cache.store(cache, digest, clean_str)
+                    pending.discard(digest)
+                cleaned += len(article['new_clean'])
+
+                # Titles and texts first read in an earlier article were
+                # cleaned for it, and are in the cache by now
+                for key, digest in article['waiting'].items():
+                    article['clean_' + key] = clean_cache.lookup(cache, digest)
+                if article['clean_sentences'] is None:
+                    article['clean_sentences'] = candidate_sentences(
+                        article['clean_text'], article['candidate_ids'])
+
+                article_store.save_clean(connection, article['article_id'],
+                                         article['clean_title'],
+                                         article['clean_text'],
+                                         article['clean_sentences'])
+                fields += 2
+    cache.close()
+    print(f"Cleaned {cleaned} titles and texts, reused {fields - cleaned}")
+
+def read_chunks(connection, cache, chunk_size, pending):
+    '''
+    Reads the articles of the store in chunks, looking up their titles and
+        texts in the clean cache. A title or text that is neither cached nor
+        pending is marked to be cleaned and added to pending; one that is
+        pending is marked as waiting for that result instead.
+
+    Inputs:
+        connection (sqlite3.Connection): the open article store
+        cache (sqlite3.Connection): the open clean cache
+        chunk_size (int): number of articles per chunk
+        pending (set): digests of the titles and texts sent to be cleaned
+            whose results haven't been stored yet
+
+    Outputs:
+        Yields lists of article dictionaries from article_store.iter_articles,
+            with the digests of their title and text, their clean_title and
+            clean_text if cached, and waiting, the digests of the ones
+            cleaned for an earlier article, keyed by 'title' or 'text'. The
+            title or text is only kept if it is to be cleaned.
+    '''
+    chunk = []
+    for article in article_store.iter_articles(connection):
+        article['digests'] = {}
+        article['waiting'] = {}
+        for key in ('title', 'text'):
+            digest = clean_cache.content_digest(CLEANER.fingerprint, key,
+                                                article[key])
+            article['digests'][key] = digest
+            article['clean_' + key] = clean_cache.lookup(cache, digest)
+            if article['clean_' + key] is not None:
+                article[key] = None
+            elif digest in pending:
+                article['waiting'][key] = digest
+                article[key] = None
+            else:
+                pending.add(digest)
+        chunk.append(article)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def clean_chunks(chunks, max_workers=None):
     '''
-    with open(sys.path[-1] + filepath) as f:
-        articles = json.load(f)
+    Cleans chunks of articles with clean_chunk, in a process pool unless
+        max_workers is 1. No more than two chunks per worker are read ahead.
 
-    for article in articles:
-        article["clean_title"] = clean_string(article,'title')
-        article["clean_text"] = clean_string(article,'text')
-        article["clean_sentences"] = clean_sentences(article,
-                                        article["clean_text"], CAND_NAME_TOKENS)
-    return articles
+    Inputs:
+        chunks (iterable of lists): chunks from read_chunks
+        max_workers (int): number of worker processes, one per core by
+            default
+
+    Outputs:
+        Yields the result of clean_chunk for each chunk, in order
+    '''
+    if max_workers == 1:
+        for chunk in chunks:
+            yield clean_chunk(chunk)
+        return
+
+    max_workers = max_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(standard_stop_words,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(clean_chunk, chunk))
+            if len(pending) == 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def init_worker(stop_words):
+    '''
+    Builds the stop word tables of a worker process once, when it starts.
+
+    Inputs:
+        stop_words (list of str): the stop words, in order
+    '''
+    global CLEANER
+    CLEANER = Cleaner(stop_words)
+
+def clean_chunk(chunk):
+    '''
+    Cleans a chunk of articles: the titles and texts read_chunks marked to be
+        cleaned, and the sentences mentioning each of their candidates. Runs in
+        the worker processes.
+
+    Inputs:
+        chunk (list of dicts): articles from read_chunks
+
+    Outputs:
+        results (list of dicts): for each article, its article_id,
+            candidate_ids, waiting, clean_title and clean_text (None while
+            waiting), clean_sentences keyed by candidate id (None while its
+            text is waiting), and new_clean, the newly cleaned strings keyed
+            by digest
+    '''
+    results = []
+    for article in chunk:
+        result = {'article_id': article['article_id'],
+                  'candidate_ids': article['candidate_ids'],
+                  'waiting': article['waiting'], 'new_clean': {}}
+        for key in ('title', 'text'):
+            clean_str = article['clean_' + key]
+            if clean_str is None and key not in article['waiting']:
+                clean_str = clean_string(article, key)
+                result['new_clean'][article['digests'][key]] = clean_str
+            result['clean_' + key] = clean_str
+
+        result['clean_sentences'] = None
+        if result['clean_text'] is not None:
+            result['clean_sentences'] = candidate_sentences(
+                result['clean_text'], article['candidate_ids'])
+        results.append(result)
+    return results
+
+def candidate_sentences(clean_text, candidate_ids):
+    '''
+    Extracts the cleaned sentences mentioning each candidate of an article.
+
+    Inputs:
+        clean_text (str): the article's cleaned text
+        candidate_ids (list of str): the candidates the article mentions
+
+    Outputs:
+        A dictionary mapping each candidate ID to its concatenated string of
+            cleaned sentences
+    '''
+    return {cand_id: clean_sentences({'candidate_id': cand_id}, clean_text,
+                                     CAND_NAME_TOKENS)
+            for cand_id in candidate_ids}
 
 def clean_string(article, key):
     '''
@@ -142,17 +326,7 @@ def clean_string(article, key):
         Outputs:
             clean_str (str): A cleaned and normalized string.
     '''
-    str_to_clean = article[key].lower()
-    remove_words = re.sub(STOP_WORDS, ' ', str_to_clean)
-    if key == 'text':
-        remove_punct = re.sub(r'[^\w\s.!?]+', ' ', remove_words)
-        replace_line_break = re.sub(r'[\n?!]', '.', remove_punct)
-        stripped_str = replace_line_break
-    else:
-        remove_punct = re.sub(r'[^\w\s]', ' ', remove_words)
-        stripped_str = remove_punct
-    clean_str = re.sub(r'\s+',' ', stripped_str)
-    return clean_str
+    return CLEANER.clean(article[key], key)
 
 def clean_sentences(article, clean_text, cand_name_dict):
     '''
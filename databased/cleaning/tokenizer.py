@@ -0,0 +1,150 @@
+'''
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBASED
+
+File name: tokenizer.py
+Associated files: clean.py
+
+Description: Cleaning engine for article titles and texts. A Cleaner splits a
+lowercased document into word tokens once, drops stop words by set lookup and
+then normalizes punctuation, sentence breaks and whitespace in one more pass.
+Its output is identical to matching the stop words as one
+\\b(word|word|...)\\b regex alternation, followed by the punctuation, sentence
+break and whitespace substitutions clean.py used to run.
+
+Most stop words are plain words, and the regex removes such a word exactly
+when it is a whole token, which a set lookup reproduces. The few that aren't
+(contractions, and words ending in '.', which the regex treats as "any
+character") are looked for once per document. Where one of them removes a
+whole token (e.g. 'ald.' matching "alds"), that token is dropped too; a
+document in which one of them would remove anything else is cleaned with the
+regex instead.
+
+Each Cleaner has a fingerprint of its stop words and of CLEANER_VERSION, so
+cleaned strings cached by utilities/clean_cache.py are only reused by a
+Cleaner that would clean them the same way.
+'''
+import re
+import hashlib
+
+# Change whenever a change to Cleaner changes its output
+CLEANER_VERSION = 1
+
+WORD_TOKENS = re.compile(r'(\w+)')
+PLAIN_WORD = re.compile(r'\w+')
+LEADING_WORD = re.compile(r'\w*')
+REGEX_SPECIAL = set('.^$*+?{}[]|()\\')
+
+# Runs of characters that become a single space: in texts, anything but word
+# characters, newlines and sentence punctuation; in titles, anything but
+# word characters
+TEXT_BLANKS = re.compile(r'[^\w\n.?!]+')
+TITLE_BLANKS = re.compile(r'\W+')
+SENTENCE_BREAKS = str.maketrans('\n?!', '...')
+
+
+class Cleaner:
+    '''
+    Cleans titles and texts with a fixed list of stop words.
+    '''
+
+    def __init__(self, stop_words):
+        '''
+        Build the stop word tables.
+
+        Inputs:
+            stop_words (list of str): lowercase stop words, in order
+        '''
+        self.stop_words_re = re.compile(r'\b(' + '|'.join(stop_words) + r')\b')
+        fingerprint = '\n'.join([str(CLEANER_VERSION)] + list(stop_words))
+        self.fingerprint = hashlib.sha1(fingerprint.encode()).hexdigest()
+        self.plain_words = set()
+        special_words = []
+        for word in stop_words:
+            if PLAIN_WORD.fullmatch(word):
+                self.plain_words.add(word)
+            elif not self.is_shadowed(word):
+                special_words.append(word)
+
+        # Positions where a special stop word could match: tokens starting
+        # with the word characters it starts with, or, if one starts with
+        # something else, every position where one matches
+        self.special_starts = None
+        prefixes = {LEADING_WORD.match(word).group() for word in special_words}
+        if '' in prefixes:
+            self.special_starts = re.compile(
+                r'(?=\b(?:' + '|'.join(special_words) + r')\b)')
+        elif prefixes:
+            self.special_starts = re.compile(
+                r'\b(?:' + '|'.join(sorted(prefixes)) + r')')
+
+    def is_shadowed(self, word):
+        '''
+        Check whether a stop word can never be the one the regex alternation
+        matches: it starts with a plain stop word listed before it, followed
+        by a literal non-word character, so wherever it matches, that plain
+        stop word matches first.
+        '''
+        prefix = LEADING_WORD.match(word).group()
+        if not prefix or prefix not in self.plain_words:
+            return False
+        return word[len(prefix)] not in REGEX_SPECIAL
+
+    def special_tokens(self, string):
+        '''
+        Find the tokens of a lowercased string that special stop words
+        remove, besides the plain stop words.
+
+        Inputs:
+            string (str): the lowercased document
+
+        Outputs:
+            A set of tokens, or None if a special stop word would remove
+            something other than a whole token
+        '''
+        tokens = set()
+        if self.special_starts is None:
+            return tokens
+        for start in self.special_starts.finditer(string):
+            match = self.stop_words_re.match(string, start.start())
+            if match is None or match.group(1) in self.plain_words:
+                continue
+            if not PLAIN_WORD.fullmatch(match.group(1)):
+                return None
+            tokens.add(match.group(1))
+        return tokens
+
+    def remove_stop_words(self, string):
+        '''
+        Replace every stop word of a lowercased string with a space.
+        '''
+        special_tokens = self.special_tokens(string)
+        if special_tokens is None:
+            return self.stop_words_re.sub(' ', string)
+
+        stop_words = self.plain_words
+        if special_tokens:
+            stop_words = stop_words | special_tokens
+        tokens = WORD_TOKENS.split(string)
+        tokens[1::2] = [' ' if token in stop_words else token
+                        for token in tokens[1::2]]
+        return ''.join(tokens)
+
+    def clean(self, string, key):
+        '''
+        Clean and normalize a title or a text by removing stop words,
+        punctuation, and excess whitespace.
+
+        Inputs:
+            string (str): the title or text
+            key (str): 'title' or 'text'. Texts keep sentence punctuation,
+                with '?', '!' and line breaks turned into '.'
+
+        Outputs:
+            clean_str (str): A cleaned and normalized string.
+        '''
+        without_stop_words = self.remove_stop_words(string.lower())
+        if key == 'text':
+            blanked = TEXT_BLANKS.sub(' ', without_stop_words)
+            return blanked.translate(SENTENCE_BREAKS)
+        return TITLE_BLANKS.sub(' ', without_stop_words)
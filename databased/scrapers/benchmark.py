@@ -0,0 +1,397 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: benchmark.py
+
+Description:
+    An offline benchmark of the newspaper scrapers. Pages recorded from the
+    real sites are served by a local HTTP server, and each scraper is run
+    against it with its base URL overridden, so throughput can be measured
+    without sending a single request to the newspapers. Latency and errors
+    can be injected on the server to see how concurrency and rate limiting
+    changes behave when a site is slow or flaky. The injected jitter and
+    errors are drawn from a seeded random generator.
+
+    Fixtures are recorded from the scrapers' HTTP cache, so run the scrapers
+    once for real, then:
+
+        python -m databased.scrapers.benchmark record
+        python -m databased.scrapers.benchmark run --latency 0.05 --error-rate 0.02
+
+    For each scraper the report gives pages and bytes served per second of
+    wall-clock time, and the time its parser takes per article page.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import http.server
+
+import requests
+from requests.utils import requote_uri
+
+from . import utils, http_cache, crawl_state, rate_limit, metrics
+from .defender import defender_scrape, scrape_page as defender_page
+from .triibe import triibe_scrape, scrape_page as triibe_page
+from .hph_scraper import hph_scrape, scrape_article as hph_article, BASE_URL as HPH_BASE_URL
+from .scrape_lawndale import ln_scrape, scrape_article as ln_article
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                           "benchmark_fixtures")
+
+# Path prefix on the fixture server for each site's origin
+SITES = {
+    "cd": "https://chicagodefender.com/",
+    "tt": "https://thetriibe.com/",
+    "hp": "https://www.hpherald.com/",
+    "ln": "http://www.lawndalenews.com/",
+}
+
+# For each scraper: its function, the output file it writes, and a function
+# parsing one fetched article page the way the scraper does
+SCRAPERS = {
+    "defender": (defender_scrape, "defender.json",
+                 lambda url, resp: defender_page(url, resp.text)),
+    "triibe": (triibe_scrape, "triibe.json",
+               lambda url, resp: triibe_page(url, resp.text)),
+    "hph": (hph_scrape, "hph.json",
+            lambda url, resp: hph_article(url[len(HPH_BASE_URL):], resp.text)),
+    "ln": (ln_scrape, "ln.json", ln_article),
+}
+
+
+def record_fixtures(fixture_dir=FIXTURE_DIR, cache_dir=None):
+    """
+    Copy every cached page of the scraped sites into a fixture directory.
+
+    Inputs:
+        fixture_dir (str): directory to write the fixtures to
+        cache_dir (str): the HTTP cache directory, http_cache.CACHE_DIR by default
+
+    Outputs:
+        The number of pages recorded
+    """
+    cache_dir = cache_dir or http_cache.CACHE_DIR
+    os.makedirs(os.path.join(fixture_dir, "bodies"), exist_ok=True)
+
+    index = {}
+    for entry_file in glob.glob(os.path.join(cache_dir, "entries", "*", "*.json")):
+        with open(entry_file) as f:
+            entry = json.load(f)
+        if not any(entry["url"].startswith(origin) for origin in SITES.values()):
+            continue
+
+        resp = http_cache.to_response(entry)
+        digest = hashlib.sha256(resp.content).hexdigest()
+        with open(os.path.join(fixture_dir, "bodies", digest), "wb") as f:
+            f.write(resp.content)
+        index[entry["url"]] = {"body": digest,
+                               "content_type": resp.headers.get("content-type",
+                                                                "text/html")}
+
+    with open(os.path.join(fixture_dir, "index.json"), "w") as f:
+        json.dump(index, f, indent=1)
+    return len(index)
+
+
+def load_fixtures(fixture_dir=FIXTURE_DIR):
+    """
+    Load recorded fixtures into memory.
+
+    Outputs:
+        A dictionary mapping each recorded URL to (content type, body bytes).
+        URLs are quoted the way requests sends them, e.g. '"' as %22, so
+        they can be compared with the paths the server receives.
+    """
+    with open(os.path.join(fixture_dir, "index.json")) as f:
+        index = json.load(f)
+
+    fixtures = {}
+    for url, fixture in index.items():
+        with open(os.path.join(fixture_dir, "bodies", fixture["body"]), "rb") as f:
+            fixtures[requote_uri(url)] = (fixture["content_type"], f.read())
+    return fixtures
+
+
+class FixtureServer:
+    """
+    A local HTTP server answering with recorded pages, with optional injected
+    latency and errors. A request for /<site>/<path> is answered with the
+    fixture of the URL SITES[site] + <path>.
+
+    Attributes:
+        port (int): the port the server listens on
+        pages (int): number of pages served successfully
+        bytes (int): number of body bytes served
+        errors (int): number of injected errors
+        missing (int): number of requests with no fixture (answered 404)
+    """
+
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, seed=0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def reset(self):
+        """
+        Zero the counters.
+        """
+        with self.lock:
+            self.pages = 0
+            self.bytes = 0
+            self.errors = 0
+            self.missing = 0
+
+    def overrides(self):
+        """
+        Return the utils.URL_OVERRIDES sending every site to this server.
+        """
+        return {origin: f"http://127.0.0.1:{self.port}/{site}/"
+                for site, origin in SITES.items()}
+
+    def original_url(self, path):
+        """
+        Return the site URL a request path on this server stands for.
+        """
+        site, _, rest = path.lstrip("/").partition("/")
+        return SITES.get(site, "") + rest
+
+    def handle(self, request):
+        """
+        Answer one request after the injected latency, with an injected
+        error, the fixture, or a 404.
+        """
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.error_rate
+        time.sleep(delay)
+
+        fixture = self.fixtures.get(self.original_url(request.path))
+        if fail:
+            status, content_type, body = self.error_status, "text/plain", b"injected error"
+        elif fixture is None:
+            status, content_type, body = 404, "text/plain", b"no fixture"
+        else:
+            status, (content_type, body) = 200, fixture
+
+        with self.lock:
+            if fail:
+                self.errors += 1
+            elif fixture is None:
+                self.missing += 1
+            else:
+                self.pages += 1
+                self.bytes += len(body)
+
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def parse_time(parse, urls, fixtures):
+    """
+    Time a scraper's article parser over the recorded pages of `urls`.
+
+    Inputs:
+        parse (function): called as parse(url, response)
+        urls (list of str): article URLs
+        fixtures (dict): the output of load_fixtures
+
+    Outputs:
+        Mean seconds per page, or None if none of the URLs were recorded
+    """
+    responses = []
+    for url in urls:
+        if requote_uri(url) in fixtures:
+            resp = requests.Response()
+            resp.status_code = 200
+            resp.encoding = "utf-8"
+            resp._content = fixtures[requote_uri(url)][1]
+            responses.append((url, resp))
+    if not responses:
+        return None
+
+    start = time.perf_counter()
+    for url, resp in responses:
+        parse(url, resp)
+    return (time.perf_counter() - start) / len(responses)
+
+
+def run_benchmark(scrapers=tuple(SCRAPERS), fixture_dir=FIXTURE_DIR, latency=0.0,
+                  jitter=0.0, error_rate=0.0, error_status=503, seed=0,
+                  discovery="search", rate_limited=True):
+    """
+    Run scrapers against the fixture server and measure them. Output files,
+    crawl state and the HTTP cache go to a temporary directory, so nothing
+    real is read or overwritten. Each scraper starts with an empty cache, so
+    every page it needs is served by the fixture server.
+
+    Inputs:
+        scrapers (tuple of str): keys of SCRAPERS to run
+        fixture_dir (str): directory of recorded fixtures
+        latency (float): seconds the server waits before every answer
+        jitter (float): up to this many more seconds, chosen at random
+        error_rate (float): fraction of requests answered with error_status
+        error_status (int): status of injected errors
+        seed (int): seed for the injected jitter and errors
+        discovery (str): passed on to the scrapers that support it
+        rate_limited (bool): whether requests are paced by rate_limit.py
+
+    Outputs:
+        A list with one dictionary of measurements per scraper
+    """
+    fixtures = load_fixtures(fixture_dir)
+    server = FixtureServer(fixtures, latency, jitter, error_rate, error_status, seed)
+    server.start()
+
+    out_dir = tempfile.mkdtemp(prefix="scraper_benchmark_")
+    os.makedirs(os.path.join(out_dir, "data"))
+    saved = (dict(utils.URL_OVERRIDES), http_cache.CACHE_DIR, crawl_state.STATE_DIR,
+             rate_limit.ENABLED)
+
+    # Scrapers write to sys.path[-1] + '/data/', see the top of each scraper
+    sys.path.append(out_dir)
+    utils.URL_OVERRIDES.update(server.overrides())
+    rate_limit.ENABLED = rate_limited
+    crawl_state.STATE_DIR = os.path.join(out_dir, "data", "crawl_state")
+
+    results = []
+    try:
+        for name in scrapers:
+            scrape, output, parse = SCRAPERS[name]
+            kwargs = {"discovery": discovery} if name != "hph" else {}
+
+            server.reset()
+            http_cache.CACHE_DIR = os.path.join(out_dir, "http_cache", name)
+            start = time.perf_counter()
+            error = None
+            try:
+                with metrics.scraper_label(name):
+                    scrape(**kwargs)
+            except Exception as e:
+                error = repr(e)
+            seconds = time.perf_counter() - start
+
+            output_path = os.path.join(out_dir, "data", output)
+            records = []
+            if os.path.exists(output_path):
+                with open(output_path) as f:
+                    records = json.load(f)
+            article_urls = list(dict.fromkeys(record["url"] for record in records))
+
+            results.append({
+                "scraper": name,
+                "seconds": seconds,
+                "pages": server.pages,
+                "bytes": server.bytes,
+                "pages_per_sec": server.pages / seconds,
+                "bytes_per_sec": server.bytes / seconds,
+                "injected_errors": server.errors,
+                "missing_fixtures": server.missing,
+                "records": len(records),
+                "parse_sec_per_page": parse_time(parse, article_urls, fixtures),
+                "error": error,
+            })
+    finally:
+        sys.path.remove(out_dir)
+        utils.URL_OVERRIDES.clear()
+        utils.URL_OVERRIDES.update(saved[0])
+        http_cache.CACHE_DIR, crawl_state.STATE_DIR, rate_limit.ENABLED = saved[1:]
+        server.stop()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    return results
+
+
+def print_report(results):
+    """
+    Print the measurements of run_benchmark as a table.
+    """
+    print(f"\n{'scraper':<10}{'seconds':>9}{'pages':>7}{'pages/s':>9}{'KB/s':>9}"
+          f"{'parse ms':>10}{'errors':>8}{'missing':>9}{'records':>9}")
+    for result in results:
+        parse_ms = result["parse_sec_per_page"]
+        parse_ms = f"{parse_ms * 1000:.2f}" if parse_ms is not None else "-"
+        print(f"{result['scraper']:<10}{result['seconds']:>9.2f}{result['pages']:>7}"
+              f"{result['pages_per_sec']:>9.1f}{result['bytes_per_sec'] / 1024:>9.1f}"
+              f"{parse_ms:>10}{result['injected_errors']:>8}"
+              f"{result['missing_fixtures']:>9}{result['records']:>9}")
+        if result["error"]:
+            print(f"    failed: {result['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scraper benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="record fixtures from the HTTP cache")
+    record.add_argument("--fixtures", default=FIXTURE_DIR)
+
+    run = commands.add_parser("run", help="run scrapers against the fixtures")
+    run.add_argument("--fixtures", default=FIXTURE_DIR)
+    run.add_argument("--scrapers", nargs="+", choices=list(SCRAPERS),
+                     default=list(SCRAPERS))
+    run.add_argument("--latency", type=float, default=0.0)
+    run.add_argument("--jitter", type=float, default=0.0)
+    run.add_argument("--error-rate", type=float, default=0.0)
+    run.add_argument("--error-status", type=int, default=503)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--discovery", choices=["search", "sitemap"], default="search")
+    run.add_argument("--no-rate-limit", dest="rate_limited", action="store_false")
+    run.add_argument("--output", help="also write the results to this JSON file")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        count = record_fixtures(args.fixtures)
+        print(f"Recorded {count} pages to {args.fixtures}")
+        return
+
+    results = run_benchmark(tuple(args.scrapers), args.fixtures, args.latency,
+                            args.jitter, args.error_rate, args.error_status,
+                            args.seed, args.discovery, args.rate_limited)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
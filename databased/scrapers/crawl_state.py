@@ -0,0 +1,160 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: crawl_state.py
+
+Description:
+    Persistent crawl state for incremental scraping. For every
+    (newspaper_id, name_token) search we keep the newest article date scraped
+    so far and every article URL already seen. Each newspaper has its own
+    file, data/crawl_state/<newspaper_id>.json, so scrapers running at the
+    same time never overwrite each other's state.
+
+    In incremental mode a scraper starts from that state: searches stop
+    paginating once they reach a URL that was already seen, and only the new
+    records are appended to the scraper's output file.
+"""
+
+import os
+import json
+from .dates import to_iso
+
+current = os.path.dirname(os.path.realpath(__file__))
+STATE_DIR = os.path.join(os.path.dirname(current), "data", "crawl_state")
+
+
+def state_path(newspaper_id, state_dir=None):
+    """
+    Return the path of the crawl state file of one newspaper.
+
+    Inputs:
+        newspaper_id (str): the id of the newspaper
+        state_dir (str): directory of the crawl state files, STATE_DIR by default
+    """
+    return os.path.join(state_dir or STATE_DIR, newspaper_id + ".json")
+
+
+def load_state(newspaper_id, state_dir=None):
+    """
+    Load the crawl state of one newspaper from disk.
+
+    Inputs:
+        newspaper_id (str): the id of the newspaper
+        state_dir (str): directory of the crawl state files, STATE_DIR by default
+
+    Returns:
+        A dictionary keyed by "newspaper_id|name_token", empty if no
+        state has been saved yet
+    """
+    filepath = state_path(newspaper_id, state_dir)
+    if not os.path.exists(filepath):
+        return {}
+
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def save_state(state, newspaper_id, state_dir=None):
+    """
+    Write the crawl state of one newspaper to disk, replacing the previous
+    state atomically.
+
+    Inputs:
+        state (dict): the crawl state
+        newspaper_id (str): the id of the newspaper
+        state_dir (str): directory of the crawl state files, STATE_DIR by default
+    """
+    filepath = state_path(newspaper_id, state_dir)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, filepath)
+
+
+def start_crawl(newspaper_id, incremental, state_dir=None):
+    """
+    Load the crawl state at the start of a scraper run. A full (not
+    incremental) run forgets everything previously seen for the newspaper.
+
+    Inputs:
+        newspaper_id (str): the id of the newspaper being scraped
+        incremental (bool): whether this run only scrapes new articles
+        state_dir (str): directory of the crawl state files, STATE_DIR by default
+
+    Returns:
+        The crawl state dictionary
+    """
+    if not incremental:
+        return {}
+    return load_state(newspaper_id, state_dir)
+
+
+def finish_crawl(state, newspaper_id, records, state_dir=None):
+    """
+    Record every newly scraped article in the crawl state and save it. Called
+    once the records have been written, so a failed run never marks articles
+    as seen.
+
+    Inputs:
+        state (dict): the crawl state
+        newspaper_id (str): the id of the newspaper scraped
+        records (list of dicts): the scraper's new output records
+        state_dir (str): directory of the crawl state files, STATE_DIR by default
+    """
+    for record in records:
+        record_article(state, newspaper_id, record["name_tokens"],
+                       record["url"], record["date"])
+    save_state(state, newspaper_id, state_dir)
+
+
+def get_entry(state, newspaper_id, name_token):
+    """
+    Return the state of one search, creating an empty one if needed.
+
+    Inputs:
+        state (dict): the crawl state
+        newspaper_id (str): the id of the newspaper searched
+        name_token (str): the name token searched for
+
+    Returns:
+        A dictionary with the keys:
+            newest_date: ISO date of the newest article scraped, or None
+            seen_urls:   list of article URLs already scraped
+    """
+    key = newspaper_id + "|" + name_token
+    return state.setdefault(key, {"newest_date": None, "seen_urls": []})
+
+
+def seen_urls(state, newspaper_id, name_token):
+    """
+    Return the set of article URLs already scraped for one search.
+    """
+    return set(get_entry(state, newspaper_id, name_token)["seen_urls"])
+
+
+def newest_date(state, newspaper_id, name_token):
+    """
+    Return the ISO date of the newest article scraped for one search, or None.
+    """
+    return get_entry(state, newspaper_id, name_token)["newest_date"]
+
+
+def record_article(state, newspaper_id, name_token, url, date):
+    """
+    Mark an article as scraped for one search and advance its newest date.
+
+    Inputs:
+        state (dict): the crawl state
+        newspaper_id (str): the id of the newspaper searched
+        name_token (str): the name token searched for
+        url (str): the URL of the scraped article
+        date (str, date or datetime): the publication date of the article
+    """
+    entry = get_entry(state, newspaper_id, name_token)
+    if url not in entry["seen_urls"]:
+        entry["seen_urls"].append(url)
+
+    iso_date = to_iso(date)
+    if entry["newest_date"] is None or iso_date > entry["newest_date"]:
+        entry["newest_date"] = iso_date
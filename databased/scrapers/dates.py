@@ -0,0 +1,72 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: dates.py
+
+Description:
+    Date parsing shared by all scrapers. Every date a scraper reads (from a
+    search listing, an article page, the database or the crawl state) goes
+    through to_date, which returns a plain datetime.date, and every date a
+    scraper writes is the ISO string from to_iso.
+
+    The formats the newspapers and the database actually use are tried first
+    with strptime; only strings matching none of them fall back to the much
+    slower pandas parser. Results are memoized, since the same date strings
+    repeat across search listings and candidates.
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+
+import pandas as pd
+
+# Formats seen on the scraped sites and in the database, most common first
+DATE_FORMATS = (
+    "%Y-%m-%d",     # 2023-02-03, ISO dates in our own output and crawl state
+    "%d-%b-%y",     # 03-Feb-23, announcement dates in the database
+    "%B %d, %Y",    # February 3, 2023
+    "%b %d, %Y",    # Feb 3, 2023
+    "%b. %d, %Y",   # Feb. 3, 2023
+)
+
+# Number of distinct date strings remembered by to_date
+CACHE_SIZE = 4096
+
+
+def to_date(value):
+    """
+    Convert a date string, date, datetime or pandas Timestamp to a date.
+
+    Inputs:
+        value (str, date or datetime): the date to convert
+
+    Outputs:
+        A datetime.date
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return _parse(value.strip())
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse(text):
+    """
+    Parse a date string, trying the known formats before pandas.
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+
+    return pd.to_datetime(text).date()
+
+
+def to_iso(value):
+    """
+    Convert a date string, date or datetime to an ISO date string, the format
+    dates are stored in in the scrapers' output.
+    """
+    return to_date(value).isoformat()
@@ -17,101 +17,98 @@ Some of the original structure of this file comes from Lee-Or's PA2 work
 
 import sys
 import os
-import json
-import lxml.html
 import copy
-import pandas as pd
-from .utils import make_request
-from datetime import datetime
+from .utils import make_request, scrape_unique, paginate, prefetching, ARTICLE_MAX_AGE
+from . import crawl_state, sitemap
+from .extraction import parse_html, select, first, body_text
+from .dates import to_date, to_iso
+from datetime import date
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from utilities.data_retrieval import search_strings
+from utilities.jsonl_sink import JsonlSink, read_records, jsonl_to_json
 
 # We are stopping our search at Feb 27, 2023
-END_DATE = datetime(2023,2,27)
+END_DATE = date(2023,2,27)
 
-def scrape_page(article_dict, url):
+def scrape_page(url, html = None):
     """
     This function takes a URL to a page and returns a dictionary with important
     information from an article
 
     Inputs:
-        article_dict (dict): a dictionary pre-filled with some key-value pairs
         url (string):  a URL to a chicago defender page
+        html (string): the already fetched page, requested here if None
 
     Returns:
         A dictionary with the following keys:
-            candidate_id:       the id associated with the candidate
-            name_tokens:        the name token associated with the search
-            announcment_date:   the date the associated candidate declared
-            newspaper_id:       the id associated with the newspaper
             url:                the URL of the webpage
             title:              the title of the webpage
             text:               the text of the webpage
             date:          the date the article was published
     """
 
-    html = make_request(url).text
+    if html is None:
+        html = make_request(url, ARTICLE_MAX_AGE).text
     root = parse_html(html)
 
-    article_dict['url'] = url
+    article = {}
+    article['url'] = url
 
-    article_dict['title'] = root.xpath("//h1")[0].text_content()
+    article['title'] = first('news_cd', 'title', root).text_content()
+    article['text'] = body_text('news_cd', root)
+    article['date'] = to_iso(first('news_cd', 'date', root).text)
 
-    body = root.xpath("//p")
+    return article
 
-    doc_text = ''
-    for row in body[2:-3]:
-        doc_text += row.text_content()
-    
-    article_dict['text'] = doc_text
-    date = root.xpath("//time")[0].text
-    date = str(pd.to_datetime(date)).split()[0]
-    article_dict['date'] = date
+def search_url(search_string, current_page, url = "https://chicagodefender.com/page/"):
+    """
+    This function builds the URL of one page of search results
 
-    return article_dict
+    Inputs:
+        search_string (str):  the string to add to create the search
+        current_page (int): The page number for the search
+        url (string): The url to search the website
 
-def parse_html(html):
-    """
-    Parse HTML and return the root node.
+    Returns:
+        The URL of the search results page
     """
-    return lxml.html.fromstring(html)
 
-def get_news_urls(search_string, stop_date, current_page = 1,
-                    url = "https://chicagodefender.com/page/"):
+    # The string needs to be "mayor + associated_name", otherwise will fix here
+    return url + str(current_page) + '/?s=' + search_string
+
+def get_news_urls(root, stop_date, seen = ()):
     """
-    This function takes a URL to a page of articles and returns a list of URLs
+    This function takes a page of articles and returns a list of URLs
     to each park on that page so long as they are later than the stop date
 
     Parameters:
-        search_string (str):  the string to add to create the search
+        root (HtmlElement): the parsed page of search results
         stop_date (datetime): the date the candidate in search_string announced
-        current_page (int): The page number for the search
-        url (string): The url to search the website
+        seen (set): URLs already scraped by a previous run; the search stops
+            at the first of them since results are newest first
 
     Returns:
-        A list of URLs to each website on the page.
+        A list of URLs to each website on the page, and whether the search
+        should continue to the next page
     """
 
-    # The string needs to be "mayor + associated_name", otherwise will fix here
-    search = url + str(current_page) + '/?s=' + search_string
     urls = []
 
-    html = make_request(search).text
-    root = parse_html(html)
-
-    links = root.xpath("//main/div[3]//a")
+    links = select('news_cd', 'result_links', root)
 
     # We will access the dates with getnext
-    dates = root.xpath("//main/div[3]//h3")
+    dates = select('news_cd', 'result_dates', root)
     date_list = []
 
-    # Turns each date into a datetime object
+    # Turns each date into a date object
     for item in dates:
         day = item.getnext().text
-        date_list.append(pd.to_datetime(day))
+        date_list.append(to_date(day))
+
+    stop_date = to_date(stop_date)
 
     # Looping through the links on a page
     for i, link in enumerate(links):
@@ -122,42 +119,66 @@ def get_news_urls(search_string, stop_date, current_page = 1,
 
         # Stopping Condition: Date is before candidate filed 
         # or after end of tracking period
-        stop_date = pd.to_datetime(stop_date)
         if date_list[i] < stop_date:
             return urls, False
         
+        # Stopping Condition: Everything from here on was already scraped
+        full_url = link.get("href")
+        if full_url in seen:
+            return urls, False
+
         # If the date is before our end date, add info
         if date_list[i] < END_DATE:
-            full_url = link.get("href")
             urls.append(full_url)
 
     return urls, True
 
-def check_next_page_exists(search_string, current_page, url = "https://chicagodefender.com/page/"):
+def page_exists(root):
     """
-    This function takes a URL to a page of search results and returns the
-    length of nav_list, which will be zero if on last page, and greater otherwise
+    This function takes a page of search results and checks that it exists,
+    i.e. that it has a nav_list of page buttons
 
     Inputs:
-        search_string (str):  the string to add to create the search
-        current_page (int): The page number for the search
-        url (string): The url to search the website
+        root (HtmlElement): the parsed page of search results
 
     Outputs:
-        Len(nav_list) (int): len of the nav_list, a list of page buttons objects
+        True if the page has at least one page button
     """
 
-    search = url + str(current_page) + '/?s=' + search_string + '"'
+    # nav_list is the list of button objects, length = 0 if page does not exist
+    nav_list = select('news_cd', 'page_buttons', root)
 
-    html = make_request(search).text
-    root = parse_html(html)
+    return len(nav_list) > 0
 
-    # nav_list is the list of button objects, length = 0 if page does not exist
-    nav_list = root.xpath("//main//li")
+def parse_search_page(current_page, resp, first_page, stop_date, seen = ()):
+    """
+    This function parses one page of search results for paginate, returning
+    the article URLs on it and the next page number to fetch
 
-    return len(nav_list)
+    Inputs:
+        current_page (int): The page number of this page
+        resp (response): The fetched page of search results
+        first_page (int): The page number the search started at
+        stop_date (datetime): the date the candidate in the search announced
+        seen (set): URLs already scraped by a previous run
 
-def defender_scrape(current_page = 1, url="https://chicagodefender.com/page/"):
+    Outputs:
+        A list of article URLs, and the next page number or None if either
+        we've crossed the date limit or there are no more pages
+    """
+
+    root = parse_html(resp.text)
+
+    # Pages after the first are only used if the search reaches them
+    if current_page > first_page and not page_exists(root):
+        return [], None
+
+    urls, status = get_news_urls(root, stop_date, seen)
+
+    return urls, (current_page + 1 if status else None)
+
+def defender_scrape(current_page = 1, url="https://chicagodefender.com/page/",
+                    incremental = False, discovery = "search"):
     """
     This function starts at the base URL for the Chicago Defender website and
     crawls through each page of the search, scraping each article before
@@ -166,6 +187,11 @@ def defender_scrape(current_page = 1, url="https://chicagodefender.com/page/"):
     Inputs:
         current_page (int): The page number for the search, initially 1
         url (string): The url to search the website
+        incremental (bool): If True, only scrape articles newer than those
+            already scraped and append them to defender.json
+        discovery (str): "search" to run one site search per search term,
+            or "sitemap" to read the site's sitemaps and match search terms
+            locally (see sitemap.py)
 
     Outputs:
         None: This function will write a list of dictionaries to a json file called
@@ -177,36 +203,93 @@ def defender_scrape(current_page = 1, url="https://chicagodefender.com/page/"):
     # Turns the df into a dictionary with key: index, value: dictionary of each row
     df_dicts = df.to_dict('index')
 
-    pages = []
-
-    # Run one while loop for each search term
-    for article_dict in df_dicts.values():
+    state = crawl_state.start_crawl('news_cd', incremental)
 
-        # Allows us to ensure that we start each while loop at the first page requested
-        search_page = current_page
-
-        # Will continue in loop until we pass stop date or pass last page of search
-        while True:
-
-            search_field = '"' + str(article_dict['name_tokens']) + '"+mayor'
-            pages_to_add, status = get_news_urls(search_field,
-                        article_dict['announcement_date'], search_page, url)
-
-            for article in pages_to_add:
-                pages.append(scrape_page(copy.deepcopy(article_dict), article))
+    # Records are streamed here as they are scraped, so an interrupted run
+    # can be restarted without scraping the same articles again
+    filepath = sys.path[-1] + '/data/defender.json'
+    sink_path = sys.path[-1] + '/data/defender.jsonl'
+    sink = JsonlSink(sink_path)
+
+    # (search row, article url) pairs, in the order the searches found them
+    matches = []
+    if discovery == "sitemap":
+        matches = sitemap.sitemap_matches(state, 'news_cd', list(df_dicts.values()))
+    else:
+        # Run one search for each search term, downloading the articles found
+        # while the later results pages and searches are fetched
+        with prefetching() as prefetch:
+            for article_dict in df_dicts.values():
+
+                # Pick up where the last run for this search term left off
+                token = article_dict['name_tokens']
+                seen = crawl_state.seen_urls(state, 'news_cd', token)
+                stop_date = article_dict['announcement_date']
+                newest = crawl_state.newest_date(state, 'news_cd', token)
+                if newest and to_date(newest) > to_date(stop_date):
+                    stop_date = newest
+
+                search_field = '"' + str(token) + '"+mayor'
+
+                # Each results page is fetched once, starting at the first page
+                # requested, until we pass stop date or pass last page of search
+                results = paginate(current_page,
+                    lambda page, resp: parse_search_page(page, resp, current_page,
+                                                         stop_date, seen),
+                    page_url=lambda page: search_url(search_field, page, url))
+
+                for pages_to_add in results:
+                    for article in pages_to_add:
+                        if article not in sink.done_urls:
+                            prefetch(article)
+                        matches.append((article_dict, article))
+
+    # Parse each article once, however many searches found it, skipping the
+    # ones already in the sink. Sitemaps also list pages that aren't
+    # articles, which are skipped too
+    articles = scrape_unique(matches, lambda article, resp: scrape_page(article, resp.text),
+                             skip_failures = discovery == "sitemap",
+                             skip = sink.done_urls)
+
+    # One record per search that found the article, written as soon as the
+    # article is scraped and tagged with the search match so that
+    # jsonl_to_json puts the records back in the order the searches found them
+    with sink:
+        for _, matched, scraped in articles:
+            pages = []
+            indexes = []
+            for index, article_dict in matched:
+                article_dicts = [article_dict]
+                if discovery == "sitemap":
+                    article_dicts = [row for row in sitemap.matching_rows(scraped, df_dicts.values())
+                                     if in_window(scraped, row)]
+
+                for article_dict in article_dicts:
+                    page = copy.deepcopy(article_dict)
+                    page.update(scraped)
+                    pages.append(page)
+                    indexes.append(index)
+            sink.write(pages, indexes)
 
-            cont = check_next_page_exists(search_field, search_page + 1, url)
+    print("Writing defender.json")
+    jsonl_to_json(sink_path, filepath, append = incremental)
+    crawl_state.finish_crawl(state, 'news_cd', read_records(sink_path))
+    os.remove(sink_path)
 
-            # If either we've crossed date limit or there are no more pages
-            if not (cont and status):
-                break
+def in_window(article, article_dict):
+    """
+    Checks that an article was published between the candidate's announcement
+    and the end of the tracking period, the dates a search stops at
 
-            search_page += 1
+    Inputs:
+        article (dict): an article as returned by scrape_page
+        article_dict (dict): the search row for the candidate
 
-    print("Writing defender.json")
-    filepath = sys.path[-1] + '/data/defender.json'
-    with open(filepath, "w") as f:
-        json.dump(pages, f, indent=1)
+    Returns:
+        True if the article falls within the candidate's date range
+    """
+    published = to_date(article['date'])
+    return to_date(article_dict['announcement_date']) <= published < END_DATE
 
 if __name__ == "__main__":
     defender_scrape()
@@ -0,0 +1,175 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: extraction.py
+
+Description:
+    Declarative extraction specs for every scraped newspaper. A spec names
+    each part of a site's search and article pages and gives the XPath or CSS
+    selector that finds it, plus how to assemble the article text from its
+    paragraphs. Selectors are compiled into lxml.etree.XPath objects once,
+    the first time a site is used, instead of being parsed again on every
+    call.
+
+    Adding a newspaper means adding an entry to SITE_SPECS; the scrapers
+    only refer to the parts by name through select, first and body_text.
+"""
+
+from functools import lru_cache
+
+import lxml.html
+from lxml import etree
+from lxml.cssselect import CSSSelector
+
+# For each newspaper id:
+#   selectors: name -> ("xpath" or "css", expression)
+#   body:      how body_text builds the article text
+#       selector: name of the selector finding the text elements
+#       slice:    (start, stop) of the elements to keep, None for all of them
+#       stop_at:  text of an element that ends the article, None for none
+SITE_SPECS = {
+    "news_cd": {
+        "selectors": {
+            "result_links": ("xpath", "//main/div[3]//a"),
+            "result_dates": ("xpath", "//main/div[3]//h3"),
+            "page_buttons": ("xpath", "//main//li"),
+            "title": ("xpath", "//h1"),
+            "date": ("xpath", "//time"),
+            "paragraphs": ("xpath", "//p"),
+        },
+        "body": {"selector": "paragraphs", "slice": (2, -3), "stop_at": None},
+    },
+    "news_tt": {
+        "selectors": {
+            "result_links": ("xpath", "//h2//a"),
+            "title": ("xpath", "//header//h1"),
+            "date": ("xpath", "//time"),
+            "paragraphs": ("xpath", "//section[*]//p"),
+        },
+        "body": {"selector": "paragraphs", "slice": (1, -4), "stop_at": None},
+    },
+    "news_hp": {
+        "selectors": {
+            "result_links": ("xpath", "/html/body/div[4]/div/div[6]/section[2]/div[2]"
+                             "/div[1]/div/div[3]/article[*]/div[1]/div[2]/div[2]/h3/a"),
+            "title": ("xpath", "//article/div[3]/header/h1/span"),
+            "date": ("xpath", "//time[1]"),
+            "paragraphs": ("css", "p"),
+        },
+        "body": {"selector": "paragraphs", "slice": None, "stop_at": "{{description}}"},
+    },
+    "news_ln": {
+        "selectors": {
+            "content": ("css", "#main #container #content"),
+            "result_rows": ("css", "div.gridrow"),
+            "result_titles": ("css", "div h2"),
+            "result_dates": ("css", "div div .meta-date"),
+            "links": ("css", "a"),
+            "body_tag": ("css", "body"),
+            "divs": ("css", "div"),
+            "article": ("css", "#main #container #content div"),
+            "title": ("css", ".entry-title"),
+            "date": ("css", ".meta-date"),
+            "entry_content": ("css", "div.entry-content"),
+        },
+        "body": {"selector": "entry_content", "slice": (0, 1), "stop_at": None},
+    },
+}
+
+
+def parse_html(html):
+    """
+    Parse HTML and return the root node.
+    """
+    return lxml.html.fromstring(html)
+
+
+def compile_selector(kind, expression):
+    """
+    Compile one selector into a callable lxml.etree.XPath object.
+
+    Inputs:
+        kind (str): "xpath" or "css"
+        expression (str): the selector
+
+    Outputs:
+        An XPath object that returns the matching elements when called on a node
+    """
+    if kind == "xpath":
+        return etree.XPath(expression)
+    if kind == "css":
+        return CSSSelector(expression, translator="html")
+    raise ValueError(f"Unknown selector kind: {kind}")
+
+
+@lru_cache(maxsize=None)
+def compiled_selectors(site):
+    """
+    Return the compiled selectors of a newspaper, compiling them on first use.
+
+    Inputs:
+        site (str): the newspaper id, a key of SITE_SPECS
+
+    Outputs:
+        A dictionary mapping each selector name to its XPath object
+    """
+    selectors = SITE_SPECS[site]["selectors"]
+    return {name: compile_selector(kind, expression)
+            for name, (kind, expression) in selectors.items()}
+
+
+def select(site, name, node):
+    """
+    Return every element under `node` matching the named selector of a site.
+
+    Inputs:
+        site (str): the newspaper id
+        name (str): the selector name in the site's spec
+        node (HtmlElement): the parsed page, or an element of it
+
+    Outputs:
+        A list of elements
+    """
+    return compiled_selectors(site)[name](node)
+
+
+def first(site, name, node):
+    """
+    Return the first element under `node` matching the named selector of a
+    site. Raises IndexError if nothing matches.
+    """
+    return select(site, name, node)[0]
+
+
+def body_text(site, node):
+    """
+    Build the article text of a page following the site's body spec. The
+    text of the kept elements is joined once rather than concatenated piece
+    by piece.
+
+    Raises ValueError if the body selector matches nothing, which means the
+    site's layout has changed, rather than returning an empty text.
+
+    Inputs:
+        site (str): the newspaper id
+        node (HtmlElement): the parsed article page, or the element holding it
+
+    Outputs:
+        The article text (str)
+    """
+    body = SITE_SPECS[site]["body"]
+    elements = select(site, body["selector"], node)
+    if not elements:
+        raise ValueError(f"No {body['selector']} found on the {site} page: "
+                         "the page layout may have changed")
+    if body["slice"] is not None:
+        elements = elements[slice(*body["slice"])]
+
+    texts = []
+    for element in elements:
+        text = element.text_content()
+        if text == body["stop_at"]:
+            break
+        texts.append(text)
+
+    return "".join(texts)
@@ -9,20 +9,22 @@ Outputs:
     
 Description: Scraper for Hyde Park Herald that outputs data in a json file
 """
-import json
-import lxml.html
-import requests
-import pandas as pd
 import os
 import sys
-import time
 import copy
+from .utils import (make_request, scrape_unique, prefetching, SEARCH_MAX_AGE,
+                    ARTICLE_MAX_AGE)
+from . import crawl_state, metrics
+from .extraction import parse_html, select, first, body_text
+from .dates import to_date, to_iso
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from utilities.data_retrieval import search_strings
+from utilities.jsonl_sink import JsonlSink, read_records, jsonl_to_json
 
+BASE_URL = "https://www.hpherald.com/"
 
 def build_url(name_token, start_date):
     """
@@ -36,7 +38,7 @@ def build_url(name_token, start_date):
     Outputs:
         url (txt): The url string to search
     """
-    start_date = str(pd.to_datetime(start_date)).split()[0]
+    start_date = to_iso(start_date)
     name_list = name_token.split()
     name_plus_delimited = "+".join(name_list)
     name_plus_delimited = name_plus_delimited.replace("'", "%27")
@@ -56,13 +58,12 @@ def get_article_urls(url):
         urls (lst of strings): List of article urls
     """
     try:
-        response = requests.get(url).text
-        root = lxml.html.fromstring(response)
-        links = root.xpath(
-            "/html/body/div[4]/div/div[6]/section[2]/div[2]/div[1]/div/div[3]/article[*]/div[1]/div[2]/div[2]/h3/a"
-        )
+        response = make_request(url, SEARCH_MAX_AGE).text
+        root = parse_html(response)
+        links = select("news_hp", "result_links", root)
     except:
         print(f"Couldn't get list of articles for {url}")
+        metrics.record_parse_failure(url)
         return False
 
     urls = []
@@ -72,30 +73,25 @@ def get_article_urls(url):
     return urls
 
 
-def scrape_article(url):
+def scrape_article(url, html=None):
     """
     Scrape the necessary info from the article
 
     Inputs:
         url (str): article url to be scraped
+        html (str): the already fetched article page, requested here if None
 
     Outputs:
         article_dataset_row (json): a json object with article dataset info
     """
     try:
-        url = "https://www.hpherald.com/" + url
-        print(f"Fetching {url}")
-        response = requests.get(url).text
-        root = lxml.html.fromstring(response)
-        date = root.xpath("//time[1]")[0].text_content()
-        date = str(pd.to_datetime(date)).split()[0]
-        title = root.xpath("//article/div[3]/header/h1/span")[0].text_content()
-        paragraphs = root.cssselect("p")
-        text = ""
-        for paragraph in paragraphs:
-            if paragraph.text_content() == "{{description}}":
-                break
-            text += paragraph.text_content()
+        url = BASE_URL + url
+        if html is None:
+            html = make_request(url, ARTICLE_MAX_AGE).text
+        root = parse_html(html)
+        date = to_iso(first("news_hp", "date", root).text_content())
+        title = first("news_hp", "title", root).text_content()
+        text = body_text("news_hp", root)
     except:
         print(f"Couldnt get article info for {url}")
         return False
@@ -103,10 +99,33 @@ def scrape_article(url):
     return url, title, text, date
 
 
-def hph_scrape():
+def parse_response(link, response):
+    """
+    Scrape an article from its fetched page
+
+    Inputs:
+        link (str): article url relative to the HPH site
+        response (response or Exception): the fetched page, or the error
+            raised while fetching it
+
+    Outputs:
+        The output of scrape_article, or False if the page couldn't be fetched
+    """
+    if isinstance(response, Exception):
+        print(f"Couldnt get article info for {BASE_URL + link}")
+        return False
+
+    return scrape_article(link, response.text)
+
+
+def hph_scrape(incremental=False):
     """
     Runs the scraper to get all article info from HPH
 
+    Inputs:
+        incremental (bool): If True, only search from the newest article already
+            scraped for each token, skip seen articles and append to hph.json
+
     Outputs:
         hph.json: json file with a list of json objects of article data
     """
@@ -114,31 +133,67 @@ def hph_scrape():
     cand_data = search_strings("news_hp")
     cand_data = cand_data.to_dict("index")
 
-    # search each token and scrape all article results for them
-    json_list = []
-    for _, val in cand_data.items():
-        url = build_url(
-            name_token=val["name_tokens"], start_date=val["announcement_date"]
-        )
-        article_links = get_article_urls(url)
+    state = crawl_state.start_crawl("news_hp", incremental)
 
-        if article_links:
-            for link in article_links:
+    # records are streamed here as they are scraped, so an interrupted run
+    # can be restarted without scraping the same articles again
+    filepath = sys.path[-1] + "/data/hph.json"
+    sink_path = sys.path[-1] + "/data/hph.jsonl"
+    sink = JsonlSink(sink_path)
+
+    # search each token and collect the (search row, article link) pairs,
+    # downloading the articles found while the later searches are fetched
+    matches = []
+    with prefetching() as prefetch:
+        for _, val in cand_data.items():
+            token = val["name_tokens"]
+            seen = crawl_state.seen_urls(state, "news_hp", token)
+
+            # pick up where the last run for this token left off
+            start_date = val["announcement_date"]
+            newest = crawl_state.newest_date(state, "news_hp", token)
+            if newest and to_date(newest) > to_date(start_date):
+                start_date = newest
+
+            url = build_url(name_token=token, start_date=start_date)
+            article_links = get_article_urls(url)
+
+            if article_links:
+                for link in article_links:
+                    if BASE_URL + link in seen:
+                        continue
+                    if BASE_URL + link not in sink.done_urls:
+                        prefetch(BASE_URL + link)
+                    matches.append((val, link))
+
+    # scrape each article once, however many searches found it, skipping the
+    # ones already in the sink
+    articles = scrape_unique(matches, parse_response,
+                             to_fetch_url=lambda link: BASE_URL + link,
+                             return_exceptions=True, skip=sink.done_urls)
+
+    # one record per search that found the article, written as soon as the
+    # article is scraped and tagged with the search match so that
+    # jsonl_to_json puts the records back in the order the searches found them
+    with sink:
+        for _, matched, article_data in articles:
+            json_list = []
+            indexes = []
+            for index, val in matched:
                 article_dict = copy.deepcopy(val)
-                article_data = scrape_article(link)
-                if article_data:
-                    url, title, text, date = article_data
-                    article_dict["url"] = url
-                    article_dict["title"] = title
-                    article_dict["text"] = text
-                    article_dict["date"] = date
-                    json_list.append(article_dict)
-                    time.sleep(0.1)
+                url, title, text, date = article_data
+                article_dict["url"] = url
+                article_dict["title"] = title
+                article_dict["text"] = text
+                article_dict["date"] = date
+                json_list.append(article_dict)
+                indexes.append(index)
+            sink.write(json_list, indexes)
 
     print("Writing hph.json")
-    filepath = sys.path[-1] + "/data/hph.json"
-    with open(filepath, "w") as f:
-        json.dump(json_list, f, indent=1)
+    jsonl_to_json(sink_path, filepath, append=incremental)
+    crawl_state.finish_crawl(state, "news_hp", read_records(sink_path))
+    os.remove(sink_path)
 
 
 if __name__ == "__main__":
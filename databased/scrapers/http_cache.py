@@ -0,0 +1,169 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: http_cache.py
+
+Description:
+    A persistent on-disk cache of scraper responses. Each cached URL has a
+    small JSON entry holding its validators (ETag and Last-Modified), the time
+    it was fetched and the hash of its body. Bodies are stored compressed and
+    content-addressed by that hash, so identical pages are only stored once.
+
+    make_request in utils.py serves fresh entries straight from the cache and
+    revalidates stale ones with a conditional GET.
+"""
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import tempfile
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "http_cache")
+
+# Set to False to always go to the network
+ENABLED = True
+
+# Response headers kept alongside each body
+STORED_HEADERS = ("etag", "last-modified", "content-type")
+
+
+def url_key(url):
+    """
+    Return the hex digest used to name the entry for `url`.
+    """
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def entry_path(url):
+    """
+    Return the path of the JSON entry for `url`.
+    """
+    key = url_key(url)
+    return os.path.join(CACHE_DIR, "entries", key[:2], key + ".json")
+
+
+def body_path(digest):
+    """
+    Return the path of the compressed body with hash `digest`.
+    """
+    return os.path.join(CACHE_DIR, "bodies", digest[:2], digest)
+
+
+def lookup(url):
+    """
+    Return the cache entry for `url`, or None if it has not been cached.
+    """
+    if not ENABLED:
+        return None
+
+    try:
+        with open(entry_path(url)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # A body can go missing if the cache directory was partially cleared
+    if not os.path.exists(body_path(entry["body"])):
+        return None
+    return entry
+
+
+def is_fresh(entry, max_age):
+    """
+    Return True if `entry` was fetched or revalidated within `max_age` seconds.
+    """
+    return time.time() - entry["fetched_at"] < max_age
+
+
+def conditional_headers(entry):
+    """
+    Return the If-None-Match / If-Modified-Since headers for revalidating
+    `entry`. Empty if the server sent no validators.
+    """
+    headers = {}
+    if entry is None:
+        return headers
+
+    if "etag" in entry["headers"]:
+        headers["If-None-Match"] = entry["headers"]["etag"]
+    if "last-modified" in entry["headers"]:
+        headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+    return headers
+
+
+def store(url, resp):
+    """
+    Save a successful response for `url` and return its new entry.
+    """
+    if not ENABLED:
+        return None
+
+    digest = hashlib.sha256(resp.content).hexdigest()
+    path = body_path(digest)
+    if not os.path.exists(path):
+        _atomic_write(path, zlib.compress(resp.content))
+
+    entry = {
+        "url": url,
+        "status": resp.status_code,
+        "encoding": resp.encoding,
+        "headers": {name: resp.headers[name] for name in STORED_HEADERS
+                    if name in resp.headers},
+        "fetched_at": time.time(),
+        "body": digest,
+    }
+    _write_entry(url, entry)
+    return entry
+
+
+def refresh(url, entry, resp):
+    """
+    Mark `entry` as revalidated after a 304 Not Modified response, taking any
+    updated validators the server sent with it.
+    """
+    for name in ("etag", "last-modified"):
+        if name in resp.headers:
+            entry["headers"][name] = resp.headers[name]
+    entry["fetched_at"] = time.time()
+    _write_entry(url, entry)
+
+
+def to_response(entry):
+    """
+    Build a requests.Response from a cache entry so that callers can use
+    the cached page exactly like a live one.
+    """
+    with open(body_path(entry["body"]), "rb") as f:
+        content = zlib.decompress(f.read())
+
+    resp = requests.Response()
+    resp.url = entry["url"]
+    resp.status_code = entry["status"]
+    resp.encoding = entry["encoding"]
+    resp.headers = CaseInsensitiveDict(entry["headers"])
+    resp._content = content
+    return resp
+
+
+def _write_entry(url, entry):
+    """
+    Write the JSON entry for `url`.
+    """
+    _atomic_write(entry_path(url), json.dumps(entry).encode("utf-8"))
+
+
+def _atomic_write(path, data):
+    """
+    Write `data` to `path` through a temporary file so that concurrent
+    readers never see a partially written file.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
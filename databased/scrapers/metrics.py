@@ -0,0 +1,278 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: metrics.py
+
+Description:
+    Structured metrics for the scrapers' fetch path. make_request and
+    scrape_unique record, for every (scraper, host) pair:
+
+        * requests sent, by status code, and requests that raised
+        * pages served from the cache
+        * a histogram of request latency
+        * bytes received
+        * retries taken by the session
+        * pages that failed to parse
+        * seconds spent waiting on the rate limiter, summed over concurrent
+          requests
+
+    The scraper a request belongs to is taken from a context variable set
+    with scraper_label, so the scrapers themselves don't pass it around.
+    At the end of a run, snapshot gives a JSON-serializable summary, and
+    write_reports saves it both as JSON and in the Prometheus text format.
+"""
+
+import os
+import copy
+import json
+import threading
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+current = os.path.dirname(os.path.realpath(__file__))
+REPORT_DIR = os.path.join(os.path.dirname(current), "data")
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+# Counters kept for every (scraper, host) pair
+COUNTERS = ("requests", "errors", "cache_hits", "bytes", "retries",
+            "parse_failures", "sleep_seconds")
+
+_scraper = contextvars.ContextVar("scraper", default="unknown")
+_series = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def scraper_label(name):
+    """
+    Attribute everything recorded inside the with block to scraper `name`.
+    Code run on other threads keeps the label as long as it runs in a copy
+    of this context (see utils.fetch_all).
+    """
+    token = _scraper.set(name)
+    try:
+        yield
+    finally:
+        _scraper.reset(token)
+
+
+def _get_series(url):
+    """
+    Return the series of the current scraper and the host of `url`,
+    creating it if needed. Must be called with _lock held.
+    """
+    key = (_scraper.get(), urlparse(url).netloc)
+    if key not in _series:
+        series = dict.fromkeys(COUNTERS, 0)
+        series["status"] = {}
+        series["latency_buckets"] = [0] * len(LATENCY_BUCKETS)
+        series["latency_sum"] = 0.0
+        _series[key] = series
+    return _series[key]
+
+
+def _observe_latency(series, elapsed):
+    """
+    Add a request latency to a series' histogram. Must be called with _lock held.
+    """
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if elapsed <= bound:
+            series["latency_buckets"][i] += 1
+            break
+    series["latency_sum"] += elapsed
+
+
+def record_response(url, resp, elapsed):
+    """
+    Record a response received from the network.
+
+    Inputs:
+        url (str): the requested URL
+        resp (response): the response, after any retries
+        elapsed (float): seconds the request took, retries included
+    """
+    retries = getattr(resp.raw, "retries", None)
+    retry_count = len(retries.history) if retries is not None else 0
+    status = str(resp.status_code)
+
+    with _lock:
+        series = _get_series(url)
+        series["requests"] += 1
+        series["status"][status] = series["status"].get(status, 0) + 1
+        series["bytes"] += len(resp.content)
+        series["retries"] += retry_count
+        _observe_latency(series, elapsed)
+
+
+def record_error(url, elapsed):
+    """
+    Record a request that raised instead of returning a response.
+    """
+    with _lock:
+        series = _get_series(url)
+        series["errors"] += 1
+        _observe_latency(series, elapsed)
+
+
+def record_cache_hit(url):
+    """
+    Record a page served from the cache without a request.
+    """
+    with _lock:
+        _get_series(url)["cache_hits"] += 1
+
+
+def record_parse_failure(url):
+    """
+    Record a page that could not be parsed.
+    """
+    with _lock:
+        _get_series(url)["parse_failures"] += 1
+
+
+def record_sleep(url, seconds):
+    """
+    Record time spent waiting on the rate limiter before requesting `url`.
+    """
+    if seconds <= 0:
+        return
+    with _lock:
+        _get_series(url)["sleep_seconds"] += seconds
+
+
+def reset():
+    """
+    Forget everything recorded so far.
+    """
+    with _lock:
+        _series.clear()
+
+
+def snapshot():
+    """
+    Return everything recorded so far as a JSON-serializable dictionary:
+
+        {"latency_buckets": [...],
+         "series": [{"scraper": ..., "host": ..., <counters>,
+                     "status": {code: count}, "latency_buckets": [...],
+                     "latency_sum": ...}, ...]}
+
+    latency_buckets counts are per bucket, not cumulative. The infinite
+    upper bound is written as null.
+    """
+    with _lock:
+        series = [dict(copy.deepcopy(values), scraper=scraper, host=host)
+                  for (scraper, host), values in sorted(_series.items())]
+
+    bounds = [bound if bound != float("inf") else None for bound in LATENCY_BUCKETS]
+    return {"latency_buckets": bounds, "series": series}
+
+
+def merge(snapshots):
+    """
+    Combine snapshots, e.g. from scrapers run in different processes, adding
+    up the series they have in common.
+
+    Inputs:
+        snapshots (list of dicts): outputs of snapshot
+
+    Outputs:
+        A single snapshot
+    """
+    merged = {}
+    for snap in snapshots:
+        for series in snap["series"]:
+            key = (series["scraper"], series["host"])
+            if key not in merged:
+                merged[key] = copy.deepcopy(series)
+                continue
+
+            total = merged[key]
+            for counter in COUNTERS + ("latency_sum",):
+                total[counter] += series[counter]
+            for status, count in series["status"].items():
+                total["status"][status] = total["status"].get(status, 0) + count
+            total["latency_buckets"] = [a + b for a, b in zip(total["latency_buckets"],
+                                                             series["latency_buckets"])]
+
+    bounds = [bound if bound != float("inf") else None for bound in LATENCY_BUCKETS]
+    return {"latency_buckets": bounds,
+            "series": [merged[key] for key in sorted(merged)]}
+
+
+def to_prometheus(snap):
+    """
+    Format a snapshot in the Prometheus text exposition format.
+
+    Inputs:
+        snap (dict): an output of snapshot or merge
+
+    Outputs:
+        The metrics as a string
+    """
+    counters = (
+        ("scraper_request_errors_total", "errors", "Requests that raised an exception"),
+        ("scraper_cache_hits_total", "cache_hits", "Pages served from the HTTP cache"),
+        ("scraper_response_bytes_total", "bytes", "Response body bytes received"),
+        ("scraper_retries_total", "retries", "Retries taken by the HTTP session"),
+        ("scraper_parse_failures_total", "parse_failures", "Pages that failed to parse"),
+        ("scraper_politeness_sleep_seconds_total", "sleep_seconds",
+         "Seconds spent waiting on the rate limiter"),
+    )
+
+    lines = ["# HELP scraper_requests_total Responses received, by status code",
+             "# TYPE scraper_requests_total counter"]
+    for series in snap["series"]:
+        for status, count in sorted(series["status"].items()):
+            lines.append(f"scraper_requests_total{{{_labels(series)},"
+                         f"status=\"{status}\"}} {count}")
+
+    for name, counter, help_text in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for series in snap["series"]:
+            lines.append(f"{name}{{{_labels(series)}}} {series[counter]}")
+
+    name = "scraper_request_duration_seconds"
+    lines.append(f"# HELP {name} Request latency, retries included")
+    lines.append(f"# TYPE {name} histogram")
+    for series in snap["series"]:
+        cumulative = 0
+        for bound, count in zip(snap["latency_buckets"], series["latency_buckets"]):
+            cumulative += count
+            le = "+Inf" if bound is None else repr(bound)
+            lines.append(f"{name}_bucket{{{_labels(series)},le=\"{le}\"}} {cumulative}")
+        lines.append(f"{name}_sum{{{_labels(series)}}} {series['latency_sum']}")
+        lines.append(f"{name}_count{{{_labels(series)}}} {cumulative}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _labels(series):
+    return f"scraper=\"{series['scraper']}\",host=\"{series['host']}\""
+
+
+def write_reports(snap=None, report_dir=None):
+    """
+    Write a snapshot to scrape_metrics.json and scrape_metrics.prom.
+
+    Inputs:
+        snap (dict): the snapshot to write, the current one by default
+        report_dir (str): directory to write to, REPORT_DIR by default
+
+    Outputs:
+        The paths of the JSON and Prometheus files
+    """
+    snap = snap if snap is not None else snapshot()
+    report_dir = report_dir or REPORT_DIR
+
+    json_path = os.path.join(report_dir, "scrape_metrics.json")
+    prom_path = os.path.join(report_dir, "scrape_metrics.prom")
+    with open(json_path, "w") as f:
+        json.dump(snap, f, indent=1)
+    with open(prom_path, "w") as f:
+        f.write(to_prometheus(snap))
+    return json_path, prom_path
@@ -0,0 +1,112 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: name_matcher.py
+
+Description:
+    Multi-pattern matching of candidate name tokens. A NameMatcher compiles
+    every name token into one Aho-Corasick automaton, so finding which
+    candidates an article mentions takes a single pass over its text, however
+    many tokens there are.
+
+    Tokens are matched as literal, case-sensitive substrings. The automaton's
+    failure links are folded into a full transition table when it is built,
+    so scanning a character is a single dictionary lookup. Characters that
+    can't start a token are skipped with a compiled regex while the automaton
+    is in its root state.
+"""
+
+import re
+from collections import deque
+
+
+class NameMatcher:
+    """
+    An Aho-Corasick automaton over candidates' name tokens.
+    """
+
+    def __init__(self, name_tokens):
+        """
+        Build the automaton.
+
+        Inputs:
+            name_tokens (list of tuples): (candidate_id, name token) pairs. A
+                candidate's tokens are preferred in the order given.
+        """
+        self.name_tokens = list(dict.fromkeys(name_tokens))
+
+        # Trie of the tokens: transitions[state] maps a character to the next
+        # state, outputs[state] holds the indexes of the tokens ending there
+        self.transitions = [{}]
+        self.outputs = [set()]
+        for i, (_, token) in enumerate(self.name_tokens):
+            state = 0
+            for char in token:
+                if char not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.outputs.append(set())
+                    self.transitions[state][char] = len(self.transitions) - 1
+                state = self.transitions[state][char]
+            self.outputs[state].add(i)
+
+        # Breadth first, so a state's failure state is complete before the
+        # state itself is
+        failure = [0] * len(self.transitions)
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = self.transitions[failure[state]]
+            for char, child in self.transitions[state].items():
+                failure[child] = fallback.get(char, 0) if state else 0
+                queue.append(child)
+            if state:
+                self.outputs[state] |= self.outputs[failure[state]]
+                for char, target in fallback.items():
+                    self.transitions[state].setdefault(char, target)
+
+        first_chars = "".join(self.transitions[0])
+        self.token_start = re.compile(f"[{re.escape(first_chars)}]")
+
+    def find_tokens(self, text):
+        """
+        Find the name tokens that appear in a text.
+
+        Inputs:
+            text (str): the text to search
+
+        Outputs:
+            A set of indexes into self.name_tokens
+        """
+        transitions = self.transitions
+        outputs = self.outputs
+        found = set()
+        state = 0
+        pos = 0
+        while pos < len(text):
+            if state == 0:
+                match = self.token_start.search(text, pos)
+                if match is None:
+                    break
+                pos = match.start()
+            state = transitions[state].get(text[pos], 0)
+            if outputs[state]:
+                found |= outputs[state]
+            pos += 1
+        return found
+
+    def match(self, text):
+        """
+        Find the candidates mentioned in a text.
+
+        Inputs:
+            text (str): the text to search
+
+        Outputs:
+            A dictionary mapping each candidate mentioned to its first name
+            token, in the order given, that appears in the text
+        """
+        matches = {}
+        for i in sorted(self.find_tokens(text)):
+            candidate_id, token = self.name_tokens[i]
+            matches.setdefault(candidate_id, token)
+        return matches
@@ -0,0 +1,145 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: orchestrator.py
+
+Description:
+    Runs every newspaper scraper and the ProQuest selection at the same time,
+    each in its own worker process. The scrapers talk to different hosts and
+    the ProQuest selection is local CPU work, so running them together takes
+    about as long as the slowest source on its own.
+
+    Progress is reported as each source finishes, and a failure in one source
+    is collected with its traceback instead of stopping the others. The fetch
+    metrics of every source are merged and written to data/scrape_metrics.json
+    and data/scrape_metrics.prom at the end of the run.
+"""
+
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .defender import defender_scrape
+from .hph_scraper import hph_scrape
+from .scrape_lawndale import ln_scrape
+from .triibe import triibe_scrape
+from .tribune_crain_select import run_selection
+from . import metrics
+
+# (name, function, whether it takes the incremental flag) for every source
+SOURCES = (
+    ("Chicago Defender", defender_scrape, True),
+    ("Hyde Park Herald", hph_scrape, True),
+    ("Lawndale News", ln_scrape, True),
+    ("The TRiiBE", triibe_scrape, True),
+    ("Chicago Tribune and Crain's Chicago Business", run_selection, False),
+)
+
+
+def run_source(name, func, kwargs):
+    """
+    Run one source and report how it went. Exceptions are caught so that one
+    failing source never takes down the others.
+
+    Inputs:
+        name (str): the name of the source
+        func (function): the function that scrapes the source
+        kwargs (dict): keyword arguments for func
+
+    Outputs:
+        A dictionary with the following keys:
+            name:    the name of the source
+            ok:      whether the source finished without an error
+            seconds: how long the source took to run
+            error:   the formatted traceback if the source failed, else None
+            metrics: the fetch metrics recorded while the source ran
+    """
+    # Worker processes can be reused, so only keep this source's metrics
+    metrics.reset()
+    start = time.perf_counter()
+    try:
+        with metrics.scraper_label(name):
+            func(**kwargs)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+
+    return {"name": name, "ok": error is None,
+            "seconds": time.perf_counter() - start, "error": error,
+            "metrics": metrics.snapshot()}
+
+
+def run_all(incremental=False, max_workers=None, sources=SOURCES):
+    """
+    Run every source in parallel and wait for all of them to finish.
+
+    Inputs:
+        incremental (bool): passed on to the sources that support it
+        max_workers (int): number of worker processes, one per source by
+            default; 1 runs the sources one after another in this process
+        sources (tuple): (name, function, takes incremental) for each source
+
+    Outputs:
+        A list with the result of run_source for every source, in the order
+        they finished
+    """
+    jobs = []
+    for name, func, takes_incremental in sources:
+        kwargs = {"incremental": incremental} if takes_incremental else {}
+        jobs.append((name, func, kwargs))
+
+    results = []
+    if max_workers == 1:
+        for job in jobs:
+            print(f"\nStarting {job[0]}")
+            results.append(report(run_source(*job), len(results) + 1, len(jobs)))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or len(jobs)) as pool:
+            futures = [pool.submit(run_source, *job) for job in jobs]
+            print(f"\nStarted {len(jobs)} sources: "
+                  + ", ".join(job[0] for job in jobs))
+
+            for future in as_completed(futures):
+                results.append(report(future.result(), len(results) + 1, len(jobs)))
+
+    print_summary(results)
+
+    json_path, prom_path = metrics.write_reports(
+        metrics.merge([result["metrics"] for result in results]))
+    print(f"Fetch metrics written to {json_path} and {prom_path}")
+    return results
+
+
+def report(result, finished, total):
+    """
+    Print a progress line for a source that has just finished.
+
+    Inputs:
+        result (dict): the output of run_source
+        finished (int): how many sources have finished, this one included
+        total (int): how many sources are running
+
+    Outputs:
+        The result, unchanged
+    """
+    status = "done" if result["ok"] else "FAILED"
+    print(f"[{finished}/{total}] {result['name']}: {status} "
+          f"in {result['seconds']:.1f}s")
+    return result
+
+
+def print_summary(results):
+    """
+    Print the errors of every failed source, or that all sources succeeded.
+
+    Inputs:
+        results (list of dicts): outputs of run_source
+    """
+    failed = [result for result in results if not result["ok"]]
+    if not failed:
+        print("All sources finished successfully.")
+        return
+
+    for result in failed:
+        print(f"\nError in {result['name']}:\n{result['error']}")
+    print(f"{len(failed)} of {len(results)} sources failed.")
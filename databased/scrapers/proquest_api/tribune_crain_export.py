@@ -2,79 +2,266 @@
 Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
 Team: dataBASED
 
-File name: export.py
-Associated files: data/proquest_files/chicago_tribune_2022.tar, 
-    data/proquest_files/chicago_tribune_2023.tar, 
-    data/proquest_files/chicago_tribune_final.tar, data/proquest_files/crain.tar
+File name: tribune_crain_export.py
+Associated files: tribune_crain_select.py, tribune_crain_process.py
 Primary Author: Kathryn Link-Oberstar
 
-Description: Convert xml files from Proquest Dataset into a list of JSON files 
-to export. This module takes a Proquest dataset (a folder of xml files - one for 
-each newssource sepcified below)  from April 11, 2022 (the date of the first 
-mayoral candidate's annoucement) to February 28, 2023 (election day) with the 
-keyword "mayor". This module converts compresses and exports the file to stay 
-within the Proquest 15MB weekly download limit. 
-This function was run 4 times for:
-    * Chicago Tribune (Online) 2022
-        files_to_export  = "data/Chicago_Tribune_-_Mayor_-_2022"
-        parq_file_path = "data/chicago_tribune_2022.parquet"
-        tz_file_path = "data/chicago_tribune_2022.tar.gz"
-    * Chicago Tribune (Online) 2023
-        files_to_export  = "data/Chicago_Tribune_-_Mayor_-_2023"
-        parq_file_path = "data/chicago_tribune_2023.parquet"
-        tz_file_path = "data/chicago_tribune_2023.tar.gz"
-        files_to_export  = "data/Chicago_Tribune_-_Mayor_-_Final_Week"
-        parq_file_path = "data/chicago_tribune_final.parquet"
-        tz_file_path = "data/chicago_tribune_final.tar.gz"
-    * Crain Business Journal
-        files_to_export  = "data/Crain_-_Mayor"
-        parq_file_path = "data/crain.parquet"
-        tz_file_path = "data/crain.tar.gz"
+Description: Convert xml files from Proquest Dataset into parquet files to
+export. Each Proquest dataset is a folder of xml files, one for each article,
+from April 11, 2022 (the date of the first mayoral candidate's annoucement) to
+February 28, 2023 (election day) with the keyword "mayor". The datasets are
+listed in EXPORTS, as (folder of xml files, parquet file path) pairs:
+    * Chicago Tribune (Online) 2022: data/Chicago_Tribune_-_Mayor_-_2022
+    * Chicago Tribune (Online) 2023: data/Chicago_Tribune_-_Mayor_-_2023
+    * Chicago Tribune (Online) final week:
+        data/Chicago_Tribune_-_Mayor_-_Final_Week
+    * Crain Business Journal: data/Crain_-_Mayor
+Running this module exports every dataset in EXPORTS whose folder exists, so
+a dataset can be exported as soon as its folder is downloaded.
+
+Each article is written as one row of a typed parquet file (schema version 2):
+    * source_id (string): the ProQuest document id (RECORD.GOID)
+    * title (string): RECORD.Obj.TitleAtt.Title
+    * text (string): RECORD.TextInfo.Text.#text, the article's HTML
+    * numeric_date (date): RECORD.Obj.NumericDate
+Columns are dictionary encoded and the file is compressed with zstd. Only
+source_id and numeric_date keep min/max statistics: those of title and text
+would copy whole titles and articles into the footer for every row group. Exports
+made before this change (schema version 1) stored the full record, converted
+with xmltodict and serialized with json.dumps, in a single 'Data' column;
+tribune_crain_process reads both.
+
+XML files are parsed in a process pool and streamed to parquet one row group at
+a time, so memory use does not grow with the size of the folder. To stay within
+the Proquest 15MB weekly download limit, a dataset is split into shards: whenever
+the next row group would take a parquet file past SIZE_BUDGET, the writer moves
+on to a new shard, and a row group too large for any shard is first split. See
+write_shards for how sizes are measured. Exporting data/crain.parquet writes
+data/crain_000.parquet, data/crain_001.parquet, ... and compresses each shard
+into its own tarball, data/crain_000.tar.gz, data/crain_001.tar.gz, ..., which
+holds the shard as data/crain_000.parquet. Every tarball fits in one weekly download.
+
+Download the tarballs into data/proquest_files; tribune_crain_select finds a
+dataset's shards there by name, in shard order.
 
 This files runs directly in ProQuest virtual environment. 
 '''
-import xmltodict
-import pyarrow
 import os
-import json
-import pandas as pd
+import tarfile
+import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import xmltodict
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# (folder of xml files, parquet file path) for each Proquest dataset
+EXPORTS = [("data/Chicago_Tribune_-_Mayor_-_2022", "data/chicago_tribune_2022.parquet"),
+           ("data/Chicago_Tribune_-_Mayor_-_2023", "data/chicago_tribune_2023.parquet"),
+           ("data/Chicago_Tribune_-_Mayor_-_Final_Week", "data/chicago_tribune_final.parquet"),
+           ("data/Crain_-_Mayor", "data/crain.parquet")]
 
-# Replace FILES_TO_EXPORT, parq_file_path and tz_file_path with correct file paths
-files_to_export  = " "
-parq_file_path = " "
-tz_file_path = " "
+# Largest parquet shard to write, in bytes. Below the 15MB weekly download
+# limit to leave room for the tarball's overhead.
+SIZE_BUDGET = 14 * 1000 * 1000
 
-# Convert folder of xml files to list of JSON files
-file_list = os.listdir(files_to_export)
-file_list = [file for file in file_list if file.endswith("xml")]
+# Number of articles per parquet row group
+ROW_GROUP_SIZE = 256
 
-list_of_file_data = []
+PARQUET_SCHEMA = pa.schema([("source_id", pa.string()),
+                            ("title", pa.string()),
+                            ("text", pa.string()),
+                            ("numeric_date", pa.date32())])
+WRITE_OPTIONS = {"use_dictionary": True, "compression": "zstd",
+                 "write_statistics": ["source_id", "numeric_date"]}
 
-for file in file_list:
-    file_path = os.path.join(files_to_export , file)
+# Bytes kept free in each shard for its footer, which is only written when
+# the shard is closed. A row group adds a few hundred bytes to the footer.
+FOOTER_RESERVE = 100 * 1000
+
+def record_row(file_as_dict):
+    '''
+    Pull the columns we keep out of one ProQuest record.
+
+    Inputs:
+        file_as_dict (dict): the record's XML converted with xmltodict
+    Output:
+        row (dict): the record's value for each column of PARQUET_SCHEMA
+    '''
+    record = file_as_dict["RECORD"]
+    numeric_date = record["Obj"]["NumericDate"]
+    return {"source_id": record["GOID"],
+            "title": record["Obj"]["TitleAtt"]["Title"],
+            "text": record["TextInfo"]["Text"]["#text"],
+            "numeric_date": datetime.date.fromisoformat(numeric_date)}
+
+def parse_xml_file(file_path):
+    '''
+    Parse one ProQuest XML file into a row. Runs in the worker processes.
+
+    Inputs:
+        file_path (string): path to the xml file
+    Output:
+        row (dict): the record's value for each column of PARQUET_SCHEMA
+    '''
     with open(file_path, "r") as f:
-        file_as_xml = f.read()
-        file_as_dict = xmltodict.parse(file_as_xml)
-        list_of_file_data.append(json.dumps(file_as_dict))
+        return record_row(xmltodict.parse(f.read()))
+
+def xml_files(folder):
+    '''
+    List the xml files of a folder, in name order so exports are reproducible.
+
+    Inputs:
+        folder (string): path to the folder of xml files
+    Output:
+        file_paths (list of strings)
+    '''
+    file_list = sorted(file for file in os.listdir(folder) if file.endswith("xml"))
+    return [os.path.join(folder, file) for file in file_list]
+
+def parse_row_groups(file_paths, row_group_size=ROW_GROUP_SIZE, max_workers=None):
+    '''
+    Parse xml files in a process pool, a row group at a time. While one row
+    group is being written the next one is already being parsed, and no more
+    than two are held in memory.
+
+    Inputs:
+        file_paths (list of strings): the xml files to parse
+        row_group_size (int): number of files per row group
+        max_workers (int): number of worker processes, one per core by default
+    Output:
+        Yields a pyarrow table for each row group, in file order
+    '''
+    batches = [file_paths[i:i + row_group_size]
+               for i in range(0, len(file_paths), row_group_size)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append([pool.submit(parse_xml_file, path) for path in batch])
+            if len(pending) == 2:
+                yield _to_table(pending.popleft())
+        while pending:
+            yield _to_table(pending.popleft())
+
+def _to_table(futures):
+    rows = [future.result() for future in futures]
+    return pa.Table.from_pylist(rows, schema=PARQUET_SCHEMA)
+
+def shard_path(file_path, index):
+    '''
+    Path of the index-th shard of a parquet file, e.g. data/crain_000.parquet.
+    '''
+    root, extension = os.path.splitext(file_path)
+    return f"{root}_{index:03d}{extension}"
+
+def write_shards(row_groups, file_path, size_budget=SIZE_BUDGET):
+    '''
+    Write row groups to parquet shards of at most size_budget bytes each.
+
+    A shard's size is the number of bytes its writer has written so far, plus
+    FOOTER_RESERVE. Before a row group is written, its size in the shard is
+    estimated as its size in memory times the largest ratio of bytes written
+    to size in memory seen so far in this export, or 1 before the first row
+    group. A row group estimated not to fit in an empty shard is split in
+    halves until every part does, and a part that does not fit in what is
+    left of the current shard starts a new one. Only a single article larger
+    than the budget can still give a shard over the budget, which is printed.
+
+    Inputs:
+        row_groups (iterable of pyarrow tables): the row groups, in order
+        file_path (string): path the shards are named after
+        size_budget (int): largest shard size in bytes
+    Output:
+        shard_paths (list of strings): the shards written, in order
+    '''
+    shard_paths = []
+    sink = writer = None
+    ratio = None
+    for table in row_groups:
+        for part in split_row_group(table, (size_budget - FOOTER_RESERVE) / (ratio or 1)):
+            estimate = part.nbytes * (ratio or 1)
+            if writer is not None and sink.tell() + estimate + FOOTER_RESERVE > size_budget:
+                close_shard(writer, sink, shard_paths[-1], size_budget)
+                writer = None
+            if writer is None:
+                shard_paths.append(shard_path(file_path, len(shard_paths)))
+                sink = pa.OSFile(shard_paths[-1], "wb")
+                writer = pq.ParquetWriter(sink, PARQUET_SCHEMA, **WRITE_OPTIONS)
+
+            start = sink.tell()
+            writer.write_table(part, row_group_size=len(part))
+            if part.nbytes:
+                ratio = max(ratio or 0, (sink.tell() - start) / part.nbytes)
+    if writer is not None:
+        close_shard(writer, sink, shard_paths[-1], size_budget)
+    return shard_paths
+
+def split_row_group(table, max_nbytes):
+    '''
+    Split a row group in halves, recursively, until each part takes at most
+    max_nbytes in memory or holds a single article.
+
+    Inputs:
+        table (pyarrow table): the row group
+        max_nbytes (float): largest size in memory of a part
+    Output:
+        parts (list of pyarrow tables): the parts, in order
+    '''
+    if table.nbytes <= max_nbytes or len(table) <= 1:
+        return [table]
+    half = len(table) // 2
+    return (split_row_group(table.slice(0, half), max_nbytes)
+            + split_row_group(table.slice(half), max_nbytes))
+
+def close_shard(writer, sink, path, size_budget):
+    '''
+    Write a shard's footer and close it, warning if it went over the budget.
+    '''
+    writer.close()
+    sink.close()
+    size = os.path.getsize(path)
+    if size > size_budget:
+        print(f"Warning: {path} is {size} bytes, over the budget of {size_budget}")
 
-# Write Dataframe to parquet and then tarball to compress file size for export
-df = pd.DataFrame(list_of_file_data)
-df.columns = ["Data"]
-df.to_parquet(parq_file_path)
+def compress_shard(path):
+    '''
+    Compress a parquet shard into a tarball next to it, storing it as
+    data/<shard name> like the earlier exports.
 
-# Compress with tarball - Select the correct file path
-# Chicago Tribune 2022
-#!tar -czvf data/chicago_tribune_2022.tar.gz data/chicago_tribune_2022.parquet
+    Inputs:
+        path (string): path to the parquet shard
+    Output:
+        tz_file_path (string): path to the tarball
+    '''
+    tz_file_path = os.path.splitext(path)[0] + ".tar.gz"
+    with tarfile.open(tz_file_path, "w:gz") as tz_file:
+        tz_file.add(path, arcname="data/" + os.path.basename(path))
+    return tz_file_path
 
-# Chicago Tribune 2023
-#!tar -czvf data/chicago_tribune_2023.tar.gz data/chicago_tribune_2023.parquet
+def export_folder(folder, file_path, size_budget=SIZE_BUDGET, max_workers=None):
+    '''
+    Convert a folder of ProQuest xml files to parquet shards within the size
+    budget, and compress each shard into a tarball.
 
-# Chicago Tribune Final Week
-#!tar -czvf data/chicago_tribune_final.tar.gz data/chicago_tribune_final.parquet
+    Inputs:
+        folder (string): path to the folder of xml files
+        file_path (string): path the parquet shards are named after
+        size_budget (int): largest shard size in bytes
+        max_workers (int): number of worker processes, one per core by default
+    Output:
+        tz_file_paths (list of strings): the tarballs written, in order
+    '''
+    row_groups = parse_row_groups(xml_files(folder), max_workers=max_workers)
+    shard_paths = write_shards(row_groups, file_path, size_budget)
+    return [compress_shard(path) for path in shard_paths]
 
-# Crain Business
-#!tar -czvf data/crain.tar.gz data/crain.parquet
+if __name__ == "__main__":
+    for files_to_export, parq_file_path in EXPORTS:
+        if not os.path.isdir(files_to_export):
+            print(f"Skipping {files_to_export}: folder not found")
+            continue
 
-# Calculate final file size (to stay within Proquest file size limit)
-file_size = os.path.getsize(tz_file_path)
-print(f"Size of file: {file_size/1000000} MB")
+        # Calculate final file sizes (to stay within Proquest file size limit)
+        for tz_file_path in export_folder(files_to_export, parq_file_path):
+            file_size = os.path.getsize(tz_file_path)
+            print(f"Size of {tz_file_path}: {file_size/1000000} MB")
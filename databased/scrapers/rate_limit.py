@@ -0,0 +1,219 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: rate_limit.py
+
+Description:
+    An adaptive per-host rate limiter shared by all scrapers. Each host gets a
+    token bucket that refills at the host's current request rate, and every
+    request takes a token before it is sent.
+
+    The rate adapts to how the host responds. Every quick, successful response
+    raises it a little, up to the host's max_rate. A 429, a timeout or a block
+    page halves it, down to its min_rate, and a Retry-After header pauses the
+    host for as long as the server asks.
+
+    make_request in utils.py calls wait before each request and feedback or
+    failure after it.
+"""
+
+import time
+import threading
+from urllib.parse import urlparse
+
+# Set to False to send requests as fast as the scrapers make them
+ENABLED = True
+
+# Requests per second a host starts at, and the range it can adapt within.
+# burst is the number of requests that can be sent back to back.
+DEFAULT_LIMITS = {"rate": 10.0, "min_rate": 0.2, "max_rate": 40.0, "burst": 4}
+
+# Per-host overrides of DEFAULT_LIMITS
+HOST_LIMITS = {
+    "www.hpherald.com": {"rate": 4.0, "max_rate": 16.0},
+    "www.lawndalenews.com": {"rate": 4.0, "max_rate": 16.0},
+}
+
+# Requests per second added after each fast successful response, and the
+# factor the rate is multiplied by when the host pushes back
+RATE_INCREASE = 0.25
+RATE_DECREASE = 0.5
+
+# Responses slower than this many seconds don't raise the rate
+SLOW_RESPONSE = 2.0
+
+# Seconds after a cut during which further pushback doesn't cut the rate
+# again, so one burst of 429s to concurrent requests counts once
+COOLDOWN = 1.0
+
+# Statuses, and snippets of page text, that mean the host is blocking us.
+# Only pages shorter than BLOCK_PAGE_SIZE bytes are checked for the markers,
+# since real articles can mention them or load captcha scripts.
+BLOCK_STATUSES = (403, 429, 503)
+BLOCK_MARKERS = ("captcha", "access denied", "are you a robot",
+                 "unusual traffic", "cf-chl")
+BLOCK_PAGE_SIZE = 20000
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket whose refill rate can change over time.
+
+    Attributes:
+        rate (float): current refill rate, in requests per second
+        min_rate (float): lowest rate the bucket backs off to
+        max_rate (float): highest rate the bucket speeds up to
+        burst (int): most tokens the bucket can hold
+        tokens (float): tokens currently available; negative when requests
+            are already queued for future tokens
+    """
+
+    def __init__(self, rate, min_rate, max_rate, burst):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_cut = float("-inf")
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Take a token, sleeping until one is available.
+
+        Returns:
+            The number of seconds spent waiting
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            # Reserve the token now and sleep outside the lock, so waiting
+            # threads queue up in order instead of polling
+            self.tokens -= 1
+            delay = max(0.0, -self.tokens / self.rate, self.paused_until - now)
+
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def speed_up(self):
+        """
+        Raise the rate additively after a healthy response.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+    def slow_down(self, pause=0.0):
+        """
+        Cut the rate multiplicatively after the host pushed back, optionally
+        pausing it entirely for `pause` seconds.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now - self.last_cut >= COOLDOWN:
+                self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+                self.last_cut = now
+            self.tokens = min(self.tokens, 0)
+            self.paused_until = max(self.paused_until, now + pause)
+
+
+def host_of(url):
+    """
+    Return the host name of `url`.
+    """
+    return urlparse(url).netloc
+
+
+def get_bucket(host):
+    """
+    Return the token bucket of `host`, creating it from HOST_LIMITS and
+    DEFAULT_LIMITS on first use.
+    """
+    with _buckets_lock:
+        if host not in _buckets:
+            limits = dict(DEFAULT_LIMITS, **HOST_LIMITS.get(host, {}))
+            _buckets[host] = TokenBucket(**limits)
+        return _buckets[host]
+
+
+def wait(url):
+    """
+    Wait until a request to `url` is allowed.
+
+    Returns:
+        The number of seconds spent waiting
+    """
+    if not ENABLED:
+        return 0.0
+    return get_bucket(host_of(url)).acquire()
+
+
+def feedback(url, resp, elapsed):
+    """
+    Adapt the rate of the host of `url` to a response it sent.
+
+    Inputs:
+        url (str): the requested URL
+        resp (response): the response, after any retries
+        elapsed (float): seconds the request took
+    """
+    if not ENABLED:
+        return
+
+    bucket = get_bucket(host_of(url))
+    if is_blocked(resp) or retried_after_pushback(resp):
+        bucket.slow_down(retry_after(resp))
+    elif elapsed < SLOW_RESPONSE:
+        bucket.speed_up()
+
+
+def failure(url):
+    """
+    Back off the host of `url` after a request timed out or failed to connect.
+    """
+    if ENABLED:
+        get_bucket(host_of(url)).slow_down()
+
+
+def is_blocked(resp):
+    """
+    Return whether `resp` is a rate limit or block page.
+    """
+    if resp.status_code in BLOCK_STATUSES:
+        return True
+    if resp.status_code != 200 or len(resp.content) >= BLOCK_PAGE_SIZE:
+        return False
+
+    text = resp.text.lower()
+    return any(marker in text for marker in BLOCK_MARKERS)
+
+
+def retried_after_pushback(resp):
+    """
+    Return whether the session retried a 429 or 503 before getting `resp`.
+    """
+    retries = getattr(resp.raw, "retries", None)
+    if retries is None:
+        return False
+    return any(attempt.status in (429, 503) for attempt in retries.history)
+
+
+def retry_after(resp):
+    """
+    Return the number of seconds the server asked us to wait in a Retry-After
+    header, or 0.
+    """
+    value = resp.headers.get("retry-after", "")
+    return float(value) if value.isdigit() else 0.0
@@ -6,38 +6,46 @@ Scrapes data from lawndale news pages pages.
 
 Methods:
     * ln_scrape - scrapes data for mayoral candidates.
-    * scrape_all_pages - scrapes data for passed candidate tokens.
+    * scrape_all_pages - finds all article URLs for passed candidate tokens.
     * get_first_search_page - finds first page of search results for passed candidate tokens.
+    * parse_search_page - finds article URLs and the next page on a search page.
     * get_article_urls - finds all park URLs on page.
     * get_next_page - finds URL to next page of article lists.
     * scrape_article - scrapes article page.
-    * date_convert - converts string to a datetime object.
-    * make_request - make a request to 'url' and return the raw response.
+    * build_record - builds the output dictionary for a candidate and article.
 
 @Author: Madeleine Roberts
 @Date: Feb 26, 2023
 """
 
 import sys
-import json
-import lxml.html
-from datetime import datetime
+import datetime
 import os
-import time
-import requests
+from .utils import make_request, scrape_unique, paginate, prefetching, ARTICLE_MAX_AGE
+from . import crawl_state, sitemap
+from .extraction import parse_html, select, first, body_text
+from .dates import to_date
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from utilities.data_retrieval import search_strings
+from utilities.jsonl_sink import JsonlSink, read_records, jsonl_to_json
 
-ELECTION_DAY = datetime(2023, 2, 28)
+ELECTION_DAY = datetime.date(2023, 2, 28)
 
-def ln_scrape():
+def ln_scrape(incremental=False, discovery='search'):
     """
     Scrapes all articles from lawndale news that are associated with the candidates 
     and candidate tokens in the database.
 
+    Parameters:
+        * incremental (bool): if True, only scrape articles newer than those
+            already scraped and append them to ln.json
+        * discovery (string): 'search' to run one site search per token, or
+            'sitemap' to read the site's sitemaps and match tokens locally
+            (see sitemap.py)
+
     Returns: 
         * A json file that contains all scraped articles for all candidates.
     """
@@ -45,54 +53,102 @@ def ln_scrape():
     cand_data = search_strings('news_ln')
     cand_data = cand_data.to_dict('index')
 
-    json_list = []
+    state = crawl_state.start_crawl('news_ln', incremental)
 
-    # Run scraper for each unique token and output to json file
-    for _, val in cand_data.items():
-        announcement_date = date_convert(val['announcement_date'], 1)
+    # Records are streamed here as they are scraped, so an interrupted run
+    # can be restarted without scraping the same articles again
+    filepath = sys.path[-1] + '/data/ln.json'
+    sink_path = sys.path[-1] + '/data/ln.jsonl'
+    sink = JsonlSink(sink_path)
 
-        article_list_for_token = scrape_all_pages(val['candidate_id'], val['name_tokens'], announcement_date)
-        json_list += article_list_for_token
+    # Find all article URLs for each unique token
+    matches = []
+    if discovery == 'sitemap':
+        matches = sitemap.sitemap_matches(state, 'news_ln', list(cand_data.values()))
+    else:
+        # Download the articles found while the later search pages are fetched
+        with prefetching() as prefetch:
+            for _, val in cand_data.items():
+                token = val['name_tokens']
+                seen = crawl_state.seen_urls(state, 'news_ln', token)
+
+                # Pick up where the last run for this token left off
+                start_date = to_date(val['announcement_date'])
+                newest = crawl_state.newest_date(state, 'news_ln', token)
+                if newest and to_date(newest) > start_date:
+                    start_date = to_date(newest)
+
+                for article_url in scrape_all_pages(token, start_date, seen):
+                    if article_url not in sink.done_urls:
+                        prefetch(article_url)
+                    matches.append((val, article_url))
+
+    # Scrape each article once, however many tokens found it, skipping the
+    # ones already in the sink. Sitemaps also list pages that aren't
+    # articles, which are skipped too
+    articles = scrape_unique(matches, scrape_article,
+                             skip_failures=discovery == 'sitemap',
+                             skip=sink.done_urls)
+
+    # One record per token that found the article, written as soon as the
+    # article is scraped and tagged with the token's match so that
+    # jsonl_to_json puts the records back in the order the tokens found them
+    with sink:
+        for _, matched, article in articles:
+            json_list = []
+            indexes = []
+            for index, val in matched:
+                vals = [val]
+                if discovery == 'sitemap':
+                    vals = sitemap.matching_rows(article, cand_data.values())
+
+                for val in vals:
+                    announcement_date = to_date(val['announcement_date'])
+
+                    # Search results were already checked against the dates on
+                    # the listing, sitemap matches weren't
+                    if (discovery == 'sitemap'
+                            and not announcement_date <= article['date'] <= ELECTION_DAY):
+                        continue
+                    json_list.append(build_record(val['candidate_id'], val['name_tokens'],
+                                                  announcement_date, article))
+                    indexes.append(index)
+            sink.write(json_list, indexes)
         
     print("Writing ln.json")
-    filepath = sys.path[-1] + '/data/ln.json'
-    with open(filepath, "w") as f:
-        json.dump(json_list, f, indent=1)
+    jsonl_to_json(sink_path, filepath, append=incremental)
+    crawl_state.finish_crawl(state, 'news_ln', read_records(sink_path))
+    os.remove(sink_path)
 
-def scrape_all_pages(candid, name_tokens, announcement_date):
+def scrape_all_pages(name_tokens, announcement_date, seen=()):
     """
-    This function takes a candidate id, the name tokens to search for, and their
-    announcement date to scrape all articles associated with these tokens.
+    This function takes the name tokens to search for and the candidate's
+    announcement date and finds all articles associated with these tokens.
 
     Parameters:
-        * candidate_id: candidate id in database
         * name_tokens:  specified search string
         * announcement_date: date of candidate announcement
+        * seen: URLs already scraped by a previous run; paging stops at the
+            first of them
 
-    Returns:
-        A list of scraped articles
+    Yields:
+        Each article URL, as soon as its search page has been read
     """
 
     # Retreive correct search url
-    current_url = get_first_search_page(name_tokens) 
-    list_of_article_urls = []
-    list_of_scraped_pages = []
-
-    while(current_url): 
-        # Scrape pages
-        print(current_url)
-        article_urls = get_article_urls(current_url, announcement_date)
-        list_of_article_urls = list_of_article_urls + article_urls
-        current_url = get_next_page(current_url)
+    first_url = get_first_search_page(name_tokens) 
 
+    # Each search page is fetched once, while the next one is prefetched
+    results = paginate(first_url,
+        lambda url, page: parse_search_page(page, announcement_date))
 
-    # Scrape all pages
-    for page_url in list_of_article_urls:
-        #print(page_url)
-        page_dict = scrape_article(page_url, candid, name_tokens, announcement_date)
-        list_of_scraped_pages.append(page_dict)
+    for article_urls in results:
 
-    return list_of_scraped_pages
+        # Stop at already scraped content, everything after it is older
+        for article_url in article_urls:
+            if article_url in seen:
+                return
+            yield article_url
     
 def get_first_search_page(full_name):
     """
@@ -110,25 +166,38 @@ def get_first_search_page(full_name):
     url = f"http://www.lawndalenews.com/?s={search_name}&x=0&y=0"
     return url
 
-def get_article_urls(url, announcement_date):
+def parse_search_page(page, announcement_date):
+    """
+    This function takes a fetched page of search results and returns both the
+    article URLs on it and the URL of the next page of results.
+
+    Parameters:
+        * page (response): a fetched page of search results
+        * announcement_date (date object): date of candidate announcement
+
+    Returns:
+        A list of article URLs, and the URL of the next page or None
+    """
+    root = parse_html(page.text)
+
+    return get_article_urls(root, announcement_date), get_next_page(root)
+
+def get_article_urls(root, announcement_date):
     """
-    This function takes a URL to a page of lawndale news and returns a
+    This function takes a page of lawndale news and returns a
     list of URLs to each park on that page.
 
     Parameters:
-        * url:  a URL to a page of parks
+        * root:  the parsed page of parks
+        * announcement_date: date of candidate announcement
 
     Returns:
         A list of URLs to each park on the page.
     """
 
-    # Temp link
-    page = make_request(url)
-    root = lxml.html.fromstring(page.text)
-
     urls = []
-    rows = root.cssselect("#main #container #content")
-    elements = rows[0].cssselect("div.gridrow")
+    content = first('news_ln', 'content', root)
+    elements = select('news_ln', 'result_rows', content)
 
     
     # Current structure of page is 3 containers, each which has at most two articles
@@ -137,8 +206,8 @@ def get_article_urls(url, announcement_date):
     
     # Scape all website links in table
     for element in elements:
-        articles = element.cssselect("div h2")
-        article_dates = element.cssselect("div div .meta-date")
+        articles = select('news_ln', 'result_titles', element)
+        article_dates = select('news_ln', 'result_dates', element)
 
         if len(articles) > 2:
             raise Exception ("Page structure has changed: more than 2 articles in container")
@@ -146,39 +215,36 @@ def get_article_urls(url, announcement_date):
         for (article, date) in zip(articles, article_dates):
             
             # Check the date is not prior to announcement
-            parsed_date = date_convert(date.text_content(), 0)
+            parsed_date = to_date(date.text_content())
             if parsed_date < announcement_date or parsed_date > ELECTION_DAY:
                 # Article was written prior to announcement
                 continue
 
-            article_url = article[0].cssselect("a")[0].get("href")
+            article_url = first('news_ln', 'links', article[0]).get("href")
 
             urls.append(article_url)
        
     return urls
 
-def get_next_page(url):
+def get_next_page(root):
     """
-    This function takes a URL to a page of newpaper articles and returns a
+    This function takes a page of newpaper articles and returns a
     URL to the next page of articles if one exists.
 
     Parameters:
-        * url (string): url to page of newpaper articles
+        * root: parsed page of newpaper articles
     
     Returns:
         A string that contains the next page of newpaper articles. If no next page exists, this function returns None.
     """
-    
-    page = make_request(url)
-    root = lxml.html.fromstring(page.text)
 
     # Check no search results
-    if root.cssselect("body")[0].get("class") == 'search search-no-results custom-background':
+    if first('news_ln', 'body_tag', root).get("class") == 'search search-no-results custom-background':
         return None
 
-    rows = root.cssselect("#main #container #content")
-    page_nav = rows[0].cssselect("div")[-1]
-    last_link = page_nav.cssselect("a")[-1]
+    content = first('news_ln', 'content', root)
+    page_nav = select('news_ln', 'divs', content)[-1]
+    last_link = select('news_ln', 'links', page_nav)[-1]
     
 
     if last_link.get("class") == "current":
@@ -193,102 +259,84 @@ def get_next_page(url):
         return None
 
 
-def scrape_article(url, cand_id, name_tokens, announcement_date):
+def scrape_article(url, page=None):
     """
-    This function takes a URL to a Lawndale newspaper article page and its repesective 
-    database tokens and returns a dictonary with database tokens (candidate_id,
-    name_tokens, announcement_date, and newspaper_id), url to article, article title,
-    article text, and article date.
+    This function takes a URL to a Lawndale newspaper article page and returns
+    a dictonary with the url to the article, article title, article text, and
+    article date.
 
     Parameters:
         * url (string):  a URL to a newspaper aticle page
-        * cand_id (string): candidate id in database
-        * name_tokens (string): specified search string
-        * announcement_date (datetime object): date of candidate announcemnt
+        * page (response): already fetched response for url, requested here if None
 
     Returns:
         A dictionary with the following keys:
-            * candidate_id: candidate id in database
-            * name_tokens:  specified search string
-            * announcement_date: date of candidate announcement
-            * newspaper_id: newspaper id in database
             * url:          the URL of the article page
             * title:        the title of article
             * text:         the text content of the article
-            * date:         the description of the park
+            * date:         the date of the article (date object)
     """
-    page = make_request(url)
-    root = lxml.html.fromstring(page.text)
+    if page is None:
+        page = make_request(url, ARTICLE_MAX_AGE)
+    root = parse_html(page.text)
 
-    article = root.cssselect("#main #container #content div") 
+    article = select('news_ln', 'article', root)
 
     # Get article title
-    title = article[0].cssselect(".entry-title")[0].text_content()
+    title = first('news_ln', 'title', article[0]).text_content()
 
     # Get date, and convert to date format 
     # Date structure: string "on April 2, 2022"
-    date = article[0].cssselect(".meta-date")[0].text_content()
+    date = first('news_ln', 'date', article[0]).text_content()
 
     if date[:3] == "on ":
         date = date[3:]
     
-    parsed_date = date_convert(date, 0)
+    parsed_date = to_date(date)
 
     # Get article text
     # Note: this includes the author and editor; this should be removed in the cleaning 
-    full_text = article[0].cssselect("div.entry-content")[0].text_content()
+    full_text = body_text('news_ln', article[0])
 
+    return {'url' : url, 'title' : title, 'text' : full_text, 'date' : parsed_date}
+
+def build_record(cand_id, name_tokens, announcement_date, article):
+    """
+    This function takes a scraped article and its repesective database tokens
+    and returns a dictonary with database tokens (candidate_id, name_tokens,
+    announcement_date, and newspaper_id), url to article, article title,
+    article text, and article date.
+
+    Parameters:
+        * cand_id (string): candidate id in database
+        * name_tokens (string): specified search string
+        * announcement_date (date object): date of candidate announcemnt
+        * article (dict): the article as returned by scrape_article
+
+    Returns:
+        A dictionary with the following keys:
+            * candidate_id: candidate id in database
+            * name_tokens:  specified search string
+            * announcement_date: date of candidate announcement
+            * newspaper_id: newspaper id in database
+            * url:          the URL of the article page
+            * title:        the title of article
+            * text:         the text content of the article
+            * date:         the date of the article
+    """
     full_article = {
         'candidate_id' : cand_id,
         'name_tokens' : name_tokens,
         'announcement_date' : announcement_date.strftime("%d-%b-%y"),
         'newspaper_id' : "news_ln",
-        'url' : url,
-        'title' : title,
-        'text' : full_text,
-        'date' : parsed_date.strftime("%d-%b-%y")
+        'url' : article['url'],
+        'title' : article['title'],
+        'text' : article['text'],
+        'date' : article['date'].isoformat()
     }
 
     return full_article
 
-def date_convert(date, flag):
-    """
-    Converts string to a datetime object
-
-    Parameters:
-        * date (string): the date to be converted
-        * flag (int): indicates the structure of date string
-
-    Return:
-        A datetime object corrisponding to the string
-    """
-    try:
-        if flag:
-            parsed_date = datetime.strptime(date, '%d-%b-%y')
-        else:
-            parsed_date = datetime.strptime(date, '%B %d, %Y')
-        return parsed_date
-    except TypeError:
-        raise("Error in date parsing: Format has changed. Type Error")
-    except ValueError:
-        raise("Error in date parsing: Format has changed. Value Error")
-    except: 
-        raise("Error in date parsing: Format has changed.")
-
-def make_request(url):
-    """
-    Make a request to 'url' and return the raw response.
-
-    Parameters:
-        * url (string): a URL to a newspaper aticle page
-    
-    Returns:
-        Raw response for url
-    """
-    time.sleep(0.1)
-    resp = requests.get(url)
-    return resp
-
 if __name__ == "__main__":
     ln_scrape()
     
@@ -0,0 +1,157 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: sitemap.py
+
+Description:
+    Sitemap discovery for the WordPress papers (Defender, TRiiBE and Lawndale
+    News). Instead of one site search per name token, a scraper in sitemap
+    mode reads the site's XML sitemaps, keeps every post modified since the
+    start of the election window, fetches each of those articles once and
+    assigns them to candidates by matching name tokens locally.
+
+    Local matching follows WordPress search, which matches a quoted phrase
+    and each extra word as case-insensitive substrings of the title and
+    content: "name" mayor finds the articles containing both.
+"""
+
+from lxml import etree
+
+from .utils import make_request, SEARCH_MAX_AGE
+from .dates import to_date
+from . import crawl_state
+
+# Sitemap indexes to try for each newspaper id, in order. wp-sitemap.xml is
+# built into WordPress, sitemap_index.xml is the Yoast SEO plugin's.
+SITEMAP_INDEXES = {
+    "news_cd": ("https://chicagodefender.com/wp-sitemap.xml",
+                "https://chicagodefender.com/sitemap_index.xml"),
+    "news_tt": ("https://thetriibe.com/wp-sitemap.xml",
+                "https://thetriibe.com/sitemap_index.xml"),
+    "news_ln": ("http://www.lawndalenews.com/wp-sitemap.xml",
+                "http://www.lawndalenews.com/sitemap_index.xml"),
+}
+
+# Child sitemaps listing posts, as named by WordPress and by Yoast
+POST_SITEMAP_MARKERS = ("wp-sitemap-posts-post-", "post-sitemap")
+
+# Word every search included along with the name token
+SEARCH_WORD = "mayor"
+
+NAMESPACE = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+SITEMAP_ENTRIES = etree.XPath("//sm:sitemap", namespaces=NAMESPACE)
+URL_ENTRIES = etree.XPath("//sm:url", namespaces=NAMESPACE)
+LOC = etree.XPath("string(sm:loc)", namespaces=NAMESPACE)
+LASTMOD = etree.XPath("string(sm:lastmod)", namespaces=NAMESPACE)
+
+
+def fetch_xml(url):
+    """
+    Fetch and parse an XML sitemap, returning its root or None if it can't
+    be fetched.
+    """
+    resp = make_request(url, SEARCH_MAX_AGE)
+    if resp.status_code != 200:
+        return None
+
+    # Sites without a sitemap often redirect to an HTML page instead
+    try:
+        return etree.fromstring(resp.content)
+    except etree.XMLSyntaxError:
+        return None
+
+
+def parse_lastmod(text):
+    """
+    Return the date of a sitemap lastmod value, or None if it has none.
+    """
+    return to_date(text[:10]) if text else None
+
+
+def discover_urls(newspaper_id, start_date, seen=()):
+    """
+    List the posts of a newspaper modified on or after `start_date`, reading
+    each sitemap once. A post modified after the window may still have been
+    published inside it, so there is no upper bound here; scrapers check the
+    article's own date after fetching it.
+
+    Inputs:
+        newspaper_id (str): a key of SITEMAP_INDEXES
+        start_date (date): the start of the election window
+        seen (set): URLs to leave out, e.g. ones already scraped
+
+    Outputs:
+        A list of article URLs, in sitemap order
+    """
+    index = None
+    for index_url in SITEMAP_INDEXES[newspaper_id]:
+        index = fetch_xml(index_url)
+        if index is not None:
+            break
+    if index is None:
+        raise Exception(f"No sitemap found for {newspaper_id}")
+
+    urls = []
+    for entry in SITEMAP_ENTRIES(index):
+        sitemap_url = LOC(entry).strip()
+        if not any(marker in sitemap_url for marker in POST_SITEMAP_MARKERS):
+            continue
+
+        # A child sitemap's lastmod is that of its newest post
+        lastmod = parse_lastmod(LASTMOD(entry).strip())
+        if lastmod is not None and lastmod < start_date:
+            continue
+
+        sitemap = fetch_xml(sitemap_url)
+        if sitemap is None:
+            continue
+
+        for url_entry in URL_ENTRIES(sitemap):
+            url = LOC(url_entry).strip()
+            lastmod = parse_lastmod(LASTMOD(url_entry).strip())
+            if url in seen or (lastmod is not None and lastmod < start_date):
+                continue
+            urls.append(url)
+
+    return list(dict.fromkeys(urls))
+
+
+def sitemap_matches(state, newspaper_id, rows):
+    """
+    Build a scraper's (search row, url) matches from the sitemaps. Articles
+    are only assigned to candidates once they have been fetched, so the
+    search row of every match is None.
+
+    Inputs:
+        state (dict): the crawl state
+        newspaper_id (str): a key of SITEMAP_INDEXES
+        rows (list of dicts): the newspaper's search rows
+
+    Outputs:
+        A list of (None, url) pairs
+    """
+    start_date = min(to_date(row["announcement_date"]) for row in rows)
+    seen = set()
+    for row in rows:
+        seen |= crawl_state.seen_urls(state, newspaper_id, row["name_tokens"])
+
+    return [(None, url) for url in discover_urls(newspaper_id, start_date, seen)]
+
+
+def matching_rows(article, rows):
+    """
+    Return the search rows whose name token an article matches, the way the
+    site search for '"name token" mayor' would.
+
+    Inputs:
+        article (dict): a scraped article with title and text
+        rows (list of dicts): search rows with a name_tokens key
+
+    Outputs:
+        The matching rows, in the order given
+    """
+    content = (article["title"] + " " + article["text"]).lower()
+    if SEARCH_WORD not in content:
+        return []
+
+    return [row for row in rows if row["name_tokens"].lower() in content]
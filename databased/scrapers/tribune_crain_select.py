@@ -9,29 +9,33 @@ Author: Kathryn Link-Oberstar
 Description: Search through a list of article dictionaries using candidate name
 tokens and assign articles to a candidate if their name appears in that article.
 Export these dictionaries as a list of JSONs.
+
+Each Proquest dataset is read from data/proquest_files, either as the shards
+written by proquest_api/tribune_crain_export.py (<name>_000.tar.gz,
+<name>_001.tar.gz, ...) or, for earlier exports, as a single <name>.tar.
 '''
 #!python3 pip install pyarrow
 import os
 import sys
-import re
 import json
-from copy import deepcopy
+import glob
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from utilities.data_retrieval import search_strings
 from scrapers.tribune_crain_process import convert_to_dict
+from scrapers.name_matcher import NameMatcher
+
+PROQUEST_DIR = sys.path[-1] + '/data/proquest_files'
 
-TRIBUNE_FILEPATHS = ([(sys.path[-1] + '/data/proquest_files/chicago_tribune_2022.tar',
-                'data/chicago_tribune_2022.parquet', 1000),
-                (sys.path[-1] + '/data/proquest_files/chicago_tribune_2023.tar',
-                'data/chicago_tribune_2023.parquet', 3000),
-                (sys.path[-1] + '/data/proquest_files/chicago_tribune_final.tar',
-                'data/chicago_tribune_final.parquet', 5000)],
+# (dataset name, number after which its articles' URLs start) for each
+# newspaper's Proquest datasets
+TRIBUNE_FILEPATHS = ([('chicago_tribune_2022', 1000),
+                ('chicago_tribune_2023', 3000),
+                ('chicago_tribune_final', 5000)],
                 "news_ct",'/data/chicago_tribune.json')
-CRAIN_FILEPATHS = ([(sys.path[-1] + '/data/proquest_files/crain.tar',
-            'data/crain.parquet', 7000)], "news_cc", '/data/crain.json')
+CRAIN_FILEPATHS = ([('crain', 7000)], "news_cc", '/data/crain.json')
 
 def run_selection():
     """
@@ -55,6 +59,24 @@ def run_selection():
         proquest_files, newspaper_id, json_filepath = paper
         export_jsons(proquest_files, newspaper_id, json_filepath)
 
+def dataset_files(name, proquest_dir=PROQUEST_DIR):
+    '''
+    Find the tarballs of a Proquest dataset: its shards in shard order if it
+    was exported in shards, or else the single tarball of an earlier export.
+
+    Inputs:
+        name (string): the dataset name, e.g. 'crain'
+        proquest_dir (string): the folder holding the tarballs
+    Output:
+        files (list of tuples of strings): the tar file path and the parquet
+            file path within it, for each tarball
+    '''
+    shards = sorted(glob.glob(os.path.join(proquest_dir, name + '_[0-9][0-9][0-9].tar.gz')))
+    if shards:
+        return [(tar, 'data/' + os.path.basename(tar)[:-len('.tar.gz')] + '.parquet')
+                for tar in shards]
+    return [(os.path.join(proquest_dir, name + '.tar'), 'data/' + name + '.parquet')]
+
 def article_selection(proquest_files, newspaper_id):
     '''
     Search list of dictionaries of articles and find all mentions of a specific
@@ -65,42 +87,45 @@ def article_selection(proquest_files, newspaper_id):
     'name_tokens', 'announcement_date' within the article dictionary will also
     be updated at this stage from None to the correct value.
 
+    Each article is scanned once for all candidates' name tokens. When several
+    of a candidate's tokens appear, the first in search_strings order is
+    recorded.
+
     Inputs:
-        proquest_files (tuple of strings): tuple of strings with the tar
-            file path and the parquet file path
+        proquest_files (list of tuples): (dataset name, number after which its
+            articles' URLs start) for each dataset. A dataset's shards number
+            their articles on from each other.
         newspaper_id (string): Unique ID for the newspaper being analyzed
     Output:
-        df_jsons (pandas dataframe): pandas dataframe of JSON files, where
-            each file is an article
+        cand_articles (dict): dictionary mapping each candidate ID to the list
+            of articles mentioning the candidate
     '''
     search_str = search_strings(newspaper_id = newspaper_id)
-    cand_name_dict = (search_str.groupby('candidate_id')['name_tokens']
-                    .apply(lambda x: list(set(x)))
-                    .to_dict())
-    cand_name_dict["cand_jg"] += ['JaMal Green']
+    name_tokens = list(zip(search_str['candidate_id'], search_str['name_tokens']))
+    name_tokens.append(("cand_jg", 'JaMal Green'))
+    matcher = NameMatcher(name_tokens)
+    announcement_dates = (search_str.drop_duplicates('candidate_id')
+                          .set_index('candidate_id')['announcement_date']
+                          .to_dict())
 
     all_articles = []
-    for file in proquest_files:
-        tar, parquet, url_counter = file
-        articles = convert_to_dict(tar, parquet, newspaper_id, url_counter)
-        all_articles += articles
+    for name, url_counter in proquest_files:
+        for tar, parquet in dataset_files(name):
+            articles = convert_to_dict(tar, parquet, newspaper_id, url_counter)
+            url_counter += len(articles)
+            all_articles += articles
 
     cand_ids = search_str['candidate_id'].unique()
     cand_articles = {val: [] for val in cand_ids}
 
     for article in all_articles:
-        for cand_id, names in cand_name_dict.items():
-            for name in names:
-                if re.search(name, article['text']):
-                    article_copy = deepcopy(article)
-                    article_copy['candidate_id'] = cand_id
-                    article_copy['name_tokens'] = name
-                    article_copy['announcement_date'] = \
-                    search_str.loc[search_str['candidate_id']
-                                    == cand_id,'announcement_date'].iloc[0]
-                    article_copy['newspaper_id'] = newspaper_id
-                    cand_articles[cand_id].append(article_copy)
-                    break
+        for cand_id, name in matcher.match(article['text']).items():
+            article_copy = dict(article)
+            article_copy['candidate_id'] = cand_id
+            article_copy['name_tokens'] = name
+            article_copy['announcement_date'] = announcement_dates[cand_id]
+            article_copy['newspaper_id'] = newspaper_id
+            cand_articles[cand_id].append(article_copy)
     return cand_articles
 
 def export_jsons(proquest_files, newspaper_id, json_filepath):
@@ -108,8 +133,8 @@ def export_jsons(proquest_files, newspaper_id, json_filepath):
     Export lists of articles to JSON filtes in the data directory.
 
     Inputs:
-        proquest_files (list of tuples of strings): tuple of strings with the
-            tar file path and the parquet file path
+        proquest_files (list of tuples): (dataset name, number after which its
+            articles' URLs start) for each dataset
         newspaper_id (string): Unique ID for the newspaper being analyzed
         json_filepath  (strong): file path to the JSON file to export
 
@@ -17,84 +17,81 @@ Some of the original structure of this file comes from Lee-Or's PA2 work
 
 import sys
 import os
-import json
-import lxml.html
-import pandas as pd
-from datetime import datetime
-from .utils import make_request
+from datetime import date
+from .utils import (make_request, scrape_unique, prefetching, SEARCH_MAX_AGE,
+                    ARTICLE_MAX_AGE)
+from . import crawl_state, sitemap
+from .extraction import parse_html, select, first, body_text
+from .dates import to_date
 import copy
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from utilities.data_retrieval import search_strings
+from utilities.jsonl_sink import JsonlSink, read_records, jsonl_to_json
 
 # We are stopping our search at Feb 27, 2023
-END_DATE = datetime(2023,2,27)
+END_DATE = date(2023,2,27)
 
 
-def scrape_page(article_dict, url):
+def scrape_page(url, html = None):
     """
     This function takes a URL to a page and returns a dictionary with important
     information from an article
 
     Inputs:
-        article_dict (dict): a dictionary pre-filled with some key-value pairs
         url (string):  a URL to a chicago defender page
+        html (string): the already fetched page, requested here if None
 
     Returns:
-        A dictionary with the following keys:
-            candidate_id:       the id associated with the candidate
-            name_tokens:        the name token associated with the search
-            announcment_date:   the date the associated candidate declared
-            newspaper_id:       the id associated with the newspaper
+        A dictionary with the following keys, or None if the article has no
+        date or title:
             url:                the URL of the webpage
+            date:               the date the article was published (date object)
             title:              the title of the webpage
             text:               the text of the webpage
-            date:          the date the article was published
     """
 
-    html = make_request(url).text
+    if html is None:
+        html = make_request(url, ARTICLE_MAX_AGE).text
     root = parse_html(html)
 
-    article_dict['url'] = url
+    article = {}
+    article['url'] = url
 
     # Some articles don't have a date. Reject them
     try:
-        date = root.xpath("//time")[0].text
+        published = first('news_tt', 'date', root).text
+        title = first('news_tt', 'title', root).text_content()
 
     except IndexError:
         print("Raising exception")
-        return article_dict, False
+        return None
 
-    date = pd.to_datetime(date)
+    article['date'] = to_date(published)
 
-    # Checking if the article is from before candidate announced
-    if date < pd.to_datetime(article_dict['announcement_date']) or date > END_DATE:
-        return article_dict, False
+    article['title'] = title
 
-    article_dict['date'] = date.date()
+    article['text'] = body_text('news_tt', root)
 
-    article_dict['title'] = root.xpath("//header//h1")[0].text_content()
+    return article
 
-    body = root.xpath("//section[*]//p")
-
-    doc_text = ''
-    for row in body[1:-4]:
-        doc_text += row.text_content()
-
-    article_dict['text'] = doc_text
-
-    # Turns announcement_date into a string for JSON
-    article_dict['date'] = str(article_dict['date'])
+def in_date_range(article, article_dict):
+    """
+    Checks that an article was published between the associated candidate's
+    announcement and the end of the tracking period
 
-    return article_dict, True
+    Inputs:
+        article (dict): an article as returned by scrape_page
+        article_dict (dict): the search row for the candidate
 
-def parse_html(html):
-    """
-    Parse HTML and return the root node.
+    Returns:
+        True if the article falls within the candidate's date range
     """
-    return lxml.html.fromstring(html)
+    published = article['date']
+    return not (published < to_date(article_dict['announcement_date'])
+                or published > END_DATE)
 
 def get_news_urls(search_string, url = "https://thetriibe.com/"):
     """
@@ -113,10 +110,10 @@ def get_news_urls(search_string, url = "https://thetriibe.com/"):
 
     urls = []
 
-    html = make_request(search).text
+    html = make_request(search, SEARCH_MAX_AGE).text
     root = parse_html(html)
 
-    links = root.xpath("//h2//a")
+    links = select('news_tt', 'result_links', root)
 
     # Looping through the links on a page
     for link in links:
@@ -125,7 +122,8 @@ def get_news_urls(search_string, url = "https://thetriibe.com/"):
 
     return urls
 
-def triibe_scrape(url="https://thetriibe.com/"):
+def triibe_scrape(url="https://thetriibe.com/", incremental=False,
+                  discovery="search"):
     """
     This function starts at the base URL for the Chicago Defender website and
     crawls through each page of the search, scraping each article before
@@ -135,6 +133,11 @@ def triibe_scrape(url="https://thetriibe.com/"):
 
     Inputs:
         url (string): The url to search the website
+        incremental (bool): If True, skip articles already scraped by a previous
+            run and append new ones to triibe.json
+        discovery (str): "search" to run one site search per search term,
+            or "sitemap" to read the site's sitemaps and match search terms
+            locally (see sitemap.py)
 
     Outputs:
         None: This function will write a list of dictionaries to a json file called
@@ -146,25 +149,73 @@ def triibe_scrape(url="https://thetriibe.com/"):
     # Turns the df into a dictionary with key: index, value: dictionary of each row
     df_dicts = df.to_dict('index')
 
-    pages = []
-
-    # Run one while loop for each search term
-    for article_dict in df_dicts.values():
-
-        search_field = '"' + str(article_dict['name_tokens']) + '"+mayor'
-        pages_to_add = get_news_urls(search_field, url)
+    state = crawl_state.start_crawl('news_tt', incremental)
 
-        for article in pages_to_add:
-            page, status = scrape_page(copy.deepcopy(article_dict), article)
-
-            # Search is not in order, must search all, only add ones before date
-            if status:
-                pages.append(page)
+    # Records are streamed here as they are scraped, so an interrupted run
+    # can be restarted without scraping the same articles again
+    filepath = sys.path[-1] + '/data/triibe.json'
+    sink_path = sys.path[-1] + '/data/triibe.jsonl'
+    sink = JsonlSink(sink_path)
+
+    # (search row, article url) pairs, in the order the searches found them
+    matches = []
+    if discovery == "sitemap":
+        matches = sitemap.sitemap_matches(state, 'news_tt', list(df_dicts.values()))
+    else:
+        # Run one search for each search term, downloading the articles found
+        # while the later searches are fetched
+        with prefetching() as prefetch:
+            for article_dict in df_dicts.values():
+
+                seen = crawl_state.seen_urls(state, 'news_tt', article_dict['name_tokens'])
+
+                # Search is not in order, so skip seen articles rather than stopping
+                search_field = '"' + str(article_dict['name_tokens']) + '"+mayor'
+                for article in get_news_urls(search_field, url):
+                    if article in seen:
+                        continue
+                    if article not in sink.done_urls:
+                        prefetch(article)
+                    matches.append((article_dict, article))
+
+    # Parse each article once, however many searches found it, skipping the
+    # ones already in the sink. Sitemaps also list pages that aren't
+    # articles, which are skipped too
+    articles = scrape_unique(matches, lambda article, resp: scrape_page(article, resp.text),
+                             skip_failures=discovery == "sitemap",
+                             skip=sink.done_urls)
+
+    # One record per search that found the article, written as soon as the
+    # article is scraped and tagged with the search match so that
+    # jsonl_to_json puts the records back in the order the searches found them
+    with sink:
+        for _, matched, scraped in articles:
+            pages = []
+            indexes = []
+            for index, article_dict in matched:
+                article_dicts = [article_dict]
+                if discovery == "sitemap":
+                    article_dicts = sitemap.matching_rows(scraped, df_dicts.values())
+
+                for article_dict in article_dicts:
+
+                    # Search is not in order, must search all, only add ones before date
+                    if not in_date_range(scraped, article_dict):
+                        continue
+
+                    page = copy.deepcopy(article_dict)
+                    page.update(scraped)
+
+                    # Turns the date into a string for JSON
+                    page['date'] = scraped['date'].isoformat()
+                    pages.append(page)
+                    indexes.append(index)
+            sink.write(pages, indexes)
 
     print("Writing triibe.json")
-    filepath = sys.path[-1] + '/data/triibe.json'
-    with open(filepath, "w") as f:
-        json.dump(pages, f, indent=1)
+    jsonl_to_json(sink_path, filepath, append=incremental)
+    crawl_state.finish_crawl(state, 'news_tt', read_records(sink_path))
+    os.remove(sink_path)
 
 if __name__ == "__main__":
     triibe_scrape()
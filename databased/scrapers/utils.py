@@ -4,22 +4,364 @@ Last Modified: 2/25/23
 
 This file is drawn directly from the utility file we were given in PA2, modified
 for use with non scrapple pages.
+
+fetch_all runs a batch of requests concurrently on an asyncio event loop, with
+at most MAX_PER_HOST requests in flight to any single host at once.
+
+All requests go through one shared requests.Session, which keeps connections
+alive between requests and retries 429/5xx responses with exponential backoff.
+Requests are paced per host by the adaptive token buckets in rate_limit.py.
+Every request, cache hit and parse failure is recorded in metrics.py.
+
+Successful responses are kept in the on-disk cache in http_cache.py. A page
+fetched less than `max_age` seconds ago is served from the cache, and an older
+one is revalidated with a conditional GET.
+
+scrape_unique fetches and parses each distinct article URL found by a scraper's
+search phase exactly once, however many candidates or name tokens matched it,
+handing results back batch by batch along with the positions of the matches
+that found them, so scrapers can write their records right away and still put
+them in match order at the end.
+
+paginate walks paginated search results, fetching every results page once and
+requesting the next page in the background while the current one is used.
+prefetching downloads the article pages a search finds into the HTTP cache
+while the search goes on, so article pages and search pages download at the
+same time and scrape_unique then reads the articles from the cache.
 """
 
 import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import http_cache, rate_limit, metrics
+
+# Maximum number of simultaneous requests sent to one host by fetch_all
+MAX_PER_HOST = 4
+
+# Number of article pages scrape_unique fetches before handing them back
+BATCH_SIZE = 32
+
+HEADERS = {'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N)\
+     AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Mobile Safari/537.36'}
+
+# Seconds to wait for a server to connect and to send data
+TIMEOUT = 30
+
+# Retries on connection errors and on these statuses, waiting
+# BACKOFF_FACTOR * 2 ** (retry - 1) seconds between attempts
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Seconds a cached page is served without asking the server again. Search
+# listings change as new articles are published, articles almost never do.
+SEARCH_MAX_AGE = 60 * 60
+ARTICLE_MAX_AGE = 30 * 24 * 60 * 60
+
+# Prefixes of URLs to send somewhere else, e.g. {"https://thetriibe.com/":
+# "http://127.0.0.1:8000/tt/"} to scrape a local copy of a site. URLs are
+# rewritten just before they're requested, so the cache, the rate limiter
+# and the scrapers still see the original URL.
+URL_OVERRIDES = {}
+
+# Number of hosts to keep connection pools for, and connections per host
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = MAX_PER_HOST
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the session shared by all scrapers, creating it on first use.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+    return _session
+
 
-REQUEST_DELAY = 0.1
+def build_session():
+    """
+    Build a requests session with bounded keep-alive connection pools and
+    retry with exponential backoff mounted for http and https.
+    """
+    retry = Retry(total=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                  status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(["GET", "HEAD"]),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                          pool_maxsize=POOL_MAXSIZE, max_retries=retry,
+                          pool_block=True)
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def make_request(url):
+def make_request(url, max_age=0):
     """
     Make a request to `url` and return the raw response.
+
+    A cached copy younger than `max_age` seconds is returned without touching
+    the network. Otherwise a cached copy is revalidated with a conditional
+    GET, and reused if the server answers 304 Not Modified. Block pages are
+    never cached.
     """
-    time.sleep(REQUEST_DELAY)
+    entry = http_cache.lookup(url)
+    if entry is not None and http_cache.is_fresh(entry, max_age):
+        metrics.record_cache_hit(url)
+        return http_cache.to_response(entry)
+
+    metrics.record_sleep(url, rate_limit.wait(url))
     print(f"Fetching {url}")
-    hdr = {'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N)\
-     AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Mobile Safari/537.36'}
-    resp = requests.get(url, headers = hdr)
+    start = time.monotonic()
+    try:
+        resp = get_session().get(rewrite_url(url),
+                                 headers=http_cache.conditional_headers(entry),
+                                 timeout=TIMEOUT)
+    except requests.RequestException as error:
+        metrics.record_error(url, time.monotonic() - start)
+        if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+            rate_limit.failure(url)
+        raise
+    elapsed = time.monotonic() - start
+    rate_limit.feedback(url, resp, elapsed)
+    metrics.record_response(url, resp, elapsed)
+
+    if resp.status_code == 304 and entry is not None:
+        http_cache.refresh(url, entry, resp)
+        return http_cache.to_response(entry)
+    # Block pages can come back as 200s; caching one would serve it as the
+    # page for as long as max_age
+    if resp.status_code == 200 and not rate_limit.is_blocked(resp):
+        http_cache.store(url, resp)
     return resp
+
+
+def rewrite_url(url):
+    """
+    Apply URL_OVERRIDES to `url`, returning it unchanged if no prefix matches.
+    """
+    for prefix, replacement in URL_OVERRIDES.items():
+        if url.startswith(prefix):
+            return replacement + url[len(prefix):]
+    return url
+
+
+def fetch_all(urls, max_per_host=MAX_PER_HOST, return_exceptions=False,
+              max_age=ARTICLE_MAX_AGE):
+    """
+    Fetch every URL in `urls` concurrently and return the raw responses in the
+    same order as `urls`.
+
+    Inputs:
+        urls (list of str): the URLs to request
+        max_per_host (int): the most requests allowed in flight to one host
+        return_exceptions (bool): if True, a failed request puts its exception
+            in the result list instead of raising it
+        max_age (int): seconds a cached page is used without revalidating
+
+    Returns:
+        A list of responses (or exceptions), one per URL
+    """
+    if not urls:
+        return []
+
+    return asyncio.run(_fetch_all(urls, max_per_host, return_exceptions, max_age))
+
+
+async def _fetch_all(urls, max_per_host, return_exceptions, max_age):
+    """
+    Coroutine behind fetch_all. Blocking requests run on a thread pool sized so
+    that every host can use its full share of concurrency, each in a copy of
+    the caller's context so that metrics are credited to the right scraper.
+    """
+    hosts = {urlparse(url).netloc for url in urls}
+    semaphores = {host: asyncio.Semaphore(max_per_host) for host in hosts}
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max_per_host * len(hosts)) as pool:
+        tasks = [_fetch_one(loop, pool, semaphores[urlparse(url).netloc], url,
+                            max_age) for url in urls]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+
+async def _fetch_one(loop, pool, semaphore, url, max_age):
+    """
+    Request a single URL once a slot for its host is free.
+    """
+    async with semaphore:
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(pool, context.run, make_request, url, max_age)
+
+
+def paginate(first_page, parse_page, page_url=None, max_age=SEARCH_MAX_AGE):
+    """
+    Iterate over the pages of a paginated search, fetching each page exactly
+    once. Each page's response is parsed into its items and a cursor for the
+    next page. The next page is requested on a background thread as soon as
+    its cursor is known, so it downloads while the caller uses the current
+    page's items.
+
+    Inputs:
+        first_page: cursor of the first results page (a URL, page number, ...)
+        parse_page (function): called as parse_page(cursor, response); returns
+            (items, next cursor), with a next cursor of None on the last page
+        page_url (function): maps a cursor to the URL to request; cursors are
+            used as URLs directly if None
+        max_age (int): seconds a cached results page is used without
+            revalidating
+
+    Yields:
+        The items parsed from each results page, in page order
+    """
+    to_url = page_url or (lambda cursor: cursor)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        cursor = first_page
+        pending = pool.submit(contextvars.copy_context().run, make_request,
+                              to_url(cursor), max_age)
+
+        while pending is not None:
+            items, next_cursor = parse_page(cursor, pending.result())
+
+            pending = None
+            if next_cursor is not None:
+                pending = pool.submit(contextvars.copy_context().run, make_request,
+                                      to_url(next_cursor), max_age)
+
+            cursor = next_cursor
+            yield items
+
+
+@contextmanager
+def prefetching(max_age=ARTICLE_MAX_AGE, max_workers=MAX_PER_HOST - 1):
+    """
+    Download article pages into the HTTP cache in the background while a
+    search phase is still running. Use as a context manager:
+
+        with prefetching() as prefetch:
+            for url in search():
+                prefetch(url)
+                matches.append((row, url))
+        articles = scrape_unique(matches, parse)
+
+    Leaving the block waits for the downloads, so scrape_unique finds every
+    page that downloaded fine in the cache and still parses each URL once;
+    it fetches a page whose download failed again itself. Nothing is
+    downloaded while the HTTP cache is turned off, as scrape_unique would
+    have to fetch every page a second time.
+
+    Inputs:
+        max_age (int): seconds a cached page is used without revalidating,
+            the max_age scrape_unique fetches with
+        max_workers (int): pages downloaded at once; one less than
+            MAX_PER_HOST by default, leaving a connection to the search pages
+
+    Yields:
+        A function prefetch(url) queueing a URL to download, once per URL
+    """
+    queued = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def prefetch(url):
+            if not http_cache.ENABLED or url in queued:
+                return
+            queued.add(url)
+            pool.submit(contextvars.copy_context().run, _prefetch_one, url, max_age)
+
+        try:
+            yield prefetch
+        except BaseException:
+            # Don't start the queued downloads if the search failed
+            pool.shutdown(cancel_futures=True)
+            raise
+
+
+def _prefetch_one(url, max_age):
+    """
+    Download one page into the HTTP cache, ignoring failures: scrape_unique
+    requests the page again and reports them.
+    """
+    try:
+        make_request(url, max_age)
+    except requests.RequestException:
+        pass
+
+
+def scrape_unique(matches, parse, to_fetch_url=None, return_exceptions=False,
+                  batch_size=BATCH_SIZE, skip_failures=False, skip=()):
+    """
+    Fetch and parse every distinct URL in `matches` exactly once, yielding
+    each result as soon as its batch is done so callers can stream records
+    out instead of holding every article in memory. Pages the scraper couldn't
+    use (parse returned None or False) are dropped.
+
+    Inputs:
+        matches (list of tuples): (search row, url) pairs from a search phase
+        parse (function): called as parse(url, response) for each distinct URL
+        to_fetch_url (function): maps a matched URL to the URL to request,
+            if they differ (e.g. relative links)
+        return_exceptions (bool): if True, a failed request is passed to
+            `parse` as its response instead of being raised
+        batch_size (int): number of URLs fetched concurrently per batch
+        skip_failures (bool): if True, a URL whose request fails or whose
+            page `parse` raises on is logged and dropped instead of stopping
+            the run, e.g. for sitemap discovery, which finds pages that
+            aren't articles
+        skip (set): URLs to request to leave out, e.g. ones already in the
+            sink. Their matches still count towards the match positions, so
+            positions stay the same when a run is restarted.
+
+    Yields:
+        (url, matched, parsed) for each distinct URL that was used, in the
+        order it was first found, where matched lists (position in matches,
+        search row) for each match of the URL, in order
+    """
+    matched_by_url = {}
+    for index, (row, url) in enumerate(matches):
+        fetch_url = url if to_fetch_url is None else to_fetch_url(url)
+        if fetch_url not in skip:
+            matched_by_url.setdefault(url, []).append((index, row))
+
+    urls = list(matched_by_url)
+    for start in range(0, len(urls), batch_size):
+        batch = urls[start:start + batch_size]
+        fetch_urls = batch if to_fetch_url is None else [to_fetch_url(url) for url in batch]
+        responses = fetch_all(fetch_urls,
+                              return_exceptions=return_exceptions or skip_failures)
+
+        for url, fetch_url, resp in zip(batch, fetch_urls, responses):
+            if skip_failures and isinstance(resp, Exception):
+                print(f"Skipping {fetch_url}: {resp!r}")
+                continue
+
+            try:
+                parsed = parse(url, resp)
+            except Exception as error:
+                metrics.record_parse_failure(fetch_url)
+                if not skip_failures:
+                    raise
+                print(f"Skipping {fetch_url}: could not parse ({error!r})")
+                continue
+
+            # Scrapers return None or False for pages they couldn't use
+            if parsed is None or parsed is False:
+                if not isinstance(resp, Exception):
+                    metrics.record_parse_failure(fetch_url)
+                continue
+            yield url, matched_by_url[url], parsed
+
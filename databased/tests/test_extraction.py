@@ -0,0 +1,27 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: test_extraction.py
+
+Description: Tests of the shared article text extraction in
+scrapers/extraction.py.
+"""
+
+import pytest
+
+from databased.scrapers.extraction import parse_html, body_text
+
+
+def test_body_text_joins_the_kept_paragraphs():
+    paragraphs = "".join(f"<p>{i} </p>" for i in range(7))
+    root = parse_html(f"<html><body>{paragraphs}</body></html>")
+
+    # The Defender spec drops the first two and last three paragraphs
+    assert body_text("news_cd", root) == "2 3 "
+
+
+def test_body_text_raises_when_the_body_selector_matches_nothing():
+    root = parse_html("<html><body><div>Page moved</div></body></html>")
+
+    with pytest.raises(ValueError):
+        body_text("news_ln", root)
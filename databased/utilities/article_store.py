@@ -0,0 +1,263 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: article_store.py
+
+Description: This module keeps the cleaned article corpus in a sqlite database
+(data/articles.db) with two tables, so that an article's text is stored once
+however many candidates it mentions:
+
+    article: one row per article, keyed by a stable article_id derived from
+        its newspaper_id and url, with its date, title and text and their
+        cleaned versions
+    mention: one row per (article_id, candidate_id), with the name token that
+        matched, the candidate's announcement date and the cleaned sentences
+        mentioning the candidate
+
+The scrapers still write one record per (candidate, article); add_records
+splits those records between the two tables. A later record for the same
+article replaces the article's fields, and a later record for the same
+(candidate, article) pair replaces the mention, which matches keeping the last
+duplicate. Each mention remembers the position of the record it came from, so
+reads come back in the order the records were added.
+"""
+
+import os
+import sqlite3
+import pathlib
+import hashlib
+
+STORE_PATH = pathlib.Path(__file__).parent.parent / "data/articles.db"
+
+# url has no declared type so sqlite keeps both web URLs and the numbers that
+# stand in for ProQuest URLs as they are
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS article (
+    article_id TEXT PRIMARY KEY,
+    newspaper_id TEXT NOT NULL,
+    url NOT NULL,
+    date TEXT,
+    title TEXT,
+    text TEXT,
+    clean_title TEXT,
+    clean_text TEXT
+);
+CREATE TABLE IF NOT EXISTS mention (
+    article_id TEXT NOT NULL REFERENCES article (article_id),
+    candidate_id TEXT NOT NULL,
+    name_tokens TEXT,
+    announcement_date TEXT,
+    clean_sentences TEXT,
+    row_order INTEGER NOT NULL,
+    PRIMARY KEY (article_id, candidate_id)
+);
+"""
+
+ARTICLE_COLUMNS = ["newspaper_id", "url", "date", "title", "text",
+                   "clean_title", "clean_text"]
+MENTION_COLUMNS = ["candidate_id", "name_tokens", "announcement_date",
+                   "clean_sentences"]
+
+# Columns of iter_mentions by default, in the order of the old
+# clean_articles.json records
+ALL_COLUMNS = ["candidate_id", "name_tokens", "announcement_date",
+               "newspaper_id", "url", "title", "text", "date", "clean_title",
+               "clean_text", "clean_sentences"]
+
+# Number of articles iter_articles reads from the database at a time
+BATCH_SIZE = 200
+
+
+def article_id(newspaper_id, url):
+    """
+    Build the stable id of an article from its newspaper and url.
+
+    Inputs:
+        newspaper_id (str): the newspaper id
+        url (str or int): the article's url, or the number standing in for it
+
+    Outputs:
+        article_id (str): a 16 character hex id
+    """
+    key = f"{newspaper_id}\n{url}".encode()
+    return hashlib.sha1(key).hexdigest()[:16]
+
+
+def connect(path=None):
+    """
+    Open the article store, creating its tables if needed.
+
+    Inputs:
+        path (str): path to the database, STORE_PATH by default
+
+    Outputs:
+        connection (sqlite3.Connection)
+    """
+    connection = sqlite3.connect(path or STORE_PATH)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def create_store(path=None):
+    """
+    Replace the article store with an empty one.
+
+    Inputs:
+        path (str): path to the database, STORE_PATH by default
+
+    Outputs:
+        connection (sqlite3.Connection)
+    """
+    path = path or STORE_PATH
+    if os.path.exists(path):
+        os.remove(path)
+    return connect(path)
+
+
+def add_records(connection, records, row_order=0):
+    """
+    Add scraper records, one per (candidate, article), to the store.
+
+    Inputs:
+        connection (sqlite3.Connection): the open store
+        records (iterable of dicts): article records with the scrapers' keys
+        row_order (int): position of the first record among all records added
+
+    Outputs:
+        The position following the last record added
+    """
+    with connection:
+        for record in records:
+            a_id = article_id(record["newspaper_id"], record["url"])
+            connection.execute(
+                "INSERT OR REPLACE INTO article (article_id, newspaper_id, url, "
+                "date, title, text) VALUES (?, ?, ?, ?, ?, ?)",
+                (a_id, record["newspaper_id"], record["url"], record["date"],
+                 record["title"], record["text"]))
+            connection.execute(
+                "INSERT OR REPLACE INTO mention (article_id, candidate_id, "
+                "name_tokens, announcement_date, row_order) VALUES (?, ?, ?, ?, ?)",
+                (a_id, record["candidate_id"], record["name_tokens"],
+                 record["announcement_date"], row_order))
+            row_order += 1
+    return row_order
+
+
+def iter_articles(connection, batch_size=BATCH_SIZE):
+    """
+    Read every article in the store, a batch at a time.
+
+    Inputs:
+        connection (sqlite3.Connection): the open store
+        batch_size (int): number of articles read at once
+
+    Outputs:
+        Yields a dictionary for each article with its article_id, title, text
+            and candidate_ids, the list of candidates it mentions
+    """
+    last_rowid = 0
+    while True:
+        rows = connection.execute(
+            "SELECT rowid, article_id, title, text FROM article WHERE rowid > ? "
+            "ORDER BY rowid LIMIT ?", (last_rowid, batch_size)).fetchall()
+        if not rows:
+            return
+
+        for rowid, a_id, title, text in rows:
+            candidate_ids = [candidate_id for (candidate_id,) in connection.execute(
+                "SELECT candidate_id FROM mention WHERE article_id = ? "
+                "ORDER BY row_order", (a_id,))]
+            yield {"article_id": a_id, "title": title, "text": text,
+                   "candidate_ids": candidate_ids}
+            last_rowid = rowid
+
+
+def save_clean(connection, a_id, clean_title, clean_text, clean_sentences):
+    """
+    Store the cleaned fields of an article and of its mentions. The caller
+    commits.
+
+    Inputs:
+        connection (sqlite3.Connection): the open store
+        a_id (str): the article id
+        clean_title (str): the cleaned title
+        clean_text (str): the cleaned text
+        clean_sentences (dict): the cleaned sentences mentioning each
+            candidate, keyed by candidate id
+    """
+    connection.execute(
+        "UPDATE article SET clean_title = ?, clean_text = ? WHERE article_id = ?",
+        (clean_title, clean_text, a_id))
+    connection.executemany(
+        "UPDATE mention SET clean_sentences = ? "
+        "WHERE article_id = ? AND candidate_id = ?",
+        [(sentences, a_id, candidate_id)
+         for candidate_id, sentences in clean_sentences.items()])
+
+
+def iter_mentions(columns=None, path=None, batch_size=BATCH_SIZE):
+    """
+    Read one row per (candidate, article), the shape of clean_articles.json,
+    with only the columns asked for, yielding the rows one at a time.
+
+    Inputs:
+        columns (list of str): columns from ALL_COLUMNS, all of them by default
+        path (str): path to the database, STORE_PATH by default
+        batch_size (int): number of rows read from the database at once
+
+    Outputs:
+        Yields a dictionary of the requested columns for each row, in the
+            order records were added
+    """
+    columns = columns or ALL_COLUMNS
+    return _iter_query(_mentions_query(columns), columns, path, batch_size)
+
+
+def iter_article_rows(columns=None, path=None, batch_size=BATCH_SIZE):
+    """
+    Read one row per article, with only the columns asked for, yielding the
+    rows one at a time.
+
+    Inputs:
+        columns (list of str): columns from ARTICLE_COLUMNS, all of them by
+            default
+        path (str): path to the database, STORE_PATH by default
+        batch_size (int): number of rows read from the database at once
+
+    Outputs:
+        Yields a dictionary of the requested columns for each article, in the
+            order of their first mention
+    """
+    columns = columns or ARTICLE_COLUMNS
+    return _iter_query(_articles_query(columns), columns, path, batch_size)
+
+
+def _articles_query(columns):
+    columns = columns or ARTICLE_COLUMNS
+    select = [f"article.{column}" for column in columns]
+    return (f"SELECT {', '.join(select)} FROM article JOIN "
+            "(SELECT article_id, MIN(row_order) AS first_mention FROM mention "
+            "GROUP BY article_id) AS first ON article.article_id = first.article_id "
+            "ORDER BY first.first_mention")
+
+
+def _mentions_query(columns):
+    columns = columns or ALL_COLUMNS
+    select = [f"mention.{column}" if column in MENTION_COLUMNS
+              else f"article.{column}" for column in columns]
+    return (f"SELECT {', '.join(select)} FROM mention JOIN article "
+            "ON mention.article_id = article.article_id ORDER BY mention.row_order")
+
+
+def _iter_query(query, columns, path, batch_size):
+    connection = sqlite3.connect(path or STORE_PATH)
+    try:
+        cursor = connection.execute(query)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        connection.close()
@@ -0,0 +1,87 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: clean_cache.py
+
+Description: This module memoizes the cleaning of titles and texts in a sqlite
+database (data/clean_cache.db) that is kept between runs. Each cleaned string
+is stored under a content hash of the raw string, whether it is a title or a
+text, and the fingerprint of the Cleaner's stop words. The same text is
+therefore cleaned once, however many articles or runs it appears in, and
+rerunning the cleaner after adding a source only cleans the new texts. A
+change to the stop words changes the fingerprint, so strings cleaned with the
+old stop words are never reused.
+"""
+
+import sqlite3
+import pathlib
+import hashlib
+
+CACHE_PATH = pathlib.Path(__file__).parent.parent / "data/clean_cache.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clean_string (
+    digest TEXT PRIMARY KEY,
+    clean TEXT NOT NULL
+);
+"""
+
+
+def connect(path=None):
+    """
+    Open the cache, creating it if needed.
+
+    Inputs:
+        path (str): path to the database, CACHE_PATH by default
+
+    Outputs:
+        connection (sqlite3.Connection)
+    """
+    connection = sqlite3.connect(path or CACHE_PATH)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def content_digest(fingerprint, key, string):
+    """
+    Build the cache key of a raw string.
+
+    Inputs:
+        fingerprint (str): the fingerprint of the Cleaner's stop words
+        key (str): 'title' or 'text'
+        string (str): the raw string
+
+    Outputs:
+        digest (str): a hex sha1 digest
+    """
+    content = f"{fingerprint}\n{key}\n{string}".encode()
+    return hashlib.sha1(content).hexdigest()
+
+
+def lookup(connection, digest):
+    """
+    Find a cleaned string in the cache.
+
+    Inputs:
+        connection (sqlite3.Connection): the open cache
+        digest (str): the content_digest of the raw string
+
+    Outputs:
+        The cleaned string, or None if it is not cached
+    """
+    row = connection.execute("SELECT clean FROM clean_string WHERE digest = ?",
+                             (digest,)).fetchone()
+    return None if row is None else row[0]
+
+
+def store(connection, digest, clean_str):
+    """
+    Add a cleaned string to the cache. The caller commits.
+
+    Inputs:
+        connection (sqlite3.Connection): the open cache
+        digest (str): the content_digest of the raw string
+        clean_str (str): the cleaned string
+    """
+    connection.execute("INSERT OR REPLACE INTO clean_string (digest, clean) "
+                       "VALUES (?, ?)", (digest, clean_str))
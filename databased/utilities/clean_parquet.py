@@ -0,0 +1,118 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: clean_parquet.py
+
+Description: This module exports the cleaned corpus from the article store
+(see article_store.py) to two parquet files that the analysis modules read:
+
+    data/clean_mentions.parquet: one row per (candidate, article), with the
+        columns of clean_articles_abr.json
+    data/clean_articles.parquet: one row per article, with its text and clean
+        text, in the order of the article's first mention
+
+Parquet is columnar, so read_mentions and read_articles only read and decode
+the columns asked for, and never touch the text columns when they aren't
+needed. The id and name columns repeat a handful of values and are dictionary
+encoded; every column is compressed with zstd. Columns are read back as plain
+strings. Both files are written a row group at a time, streaming from the
+store.
+
+url is stored as a string: ProQuest articles use numbers in place of URLs,
+and a parquet column holds a single type.
+"""
+
+import pathlib
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utilities import article_store
+
+DATA_PATH = pathlib.Path(__file__).parent.parent / "data"
+MENTIONS_PATH = DATA_PATH / "clean_mentions.parquet"
+ARTICLES_PATH = DATA_PATH / "clean_articles.parquet"
+
+MENTION_COLUMNS = ["candidate_id", "name_tokens", "announcement_date",
+                   "newspaper_id", "url", "date", "clean_title",
+                   "clean_sentences"]
+ARTICLE_COLUMNS = article_store.ARTICLE_COLUMNS
+
+MENTION_SCHEMA = pa.schema([(column, pa.string()) for column in MENTION_COLUMNS])
+ARTICLE_SCHEMA = pa.schema([(column, pa.string()) for column in ARTICLE_COLUMNS])
+
+# Columns with few distinct values, stored as a dictionary of the values
+# and an index into it for each row
+DICTIONARY_COLUMNS = ["candidate_id", "name_tokens", "announcement_date",
+                      "newspaper_id"]
+WRITE_OPTIONS = {"use_dictionary": DICTIONARY_COLUMNS, "compression": "zstd"}
+
+# Number of rows per parquet row group
+ROW_GROUP_SIZE = 1000
+
+
+def export_parquet(store_path=None, mentions_path=None, articles_path=None):
+    """
+    Write the cleaned mentions and articles of the store to parquet.
+
+    Inputs:
+        store_path (str): path to the article store, STORE_PATH by default
+        mentions_path (str): path to write the mentions to, MENTIONS_PATH by
+            default
+        articles_path (str): path to write the articles to, ARTICLES_PATH by
+            default
+    """
+    mentions = article_store.iter_mentions(MENTION_COLUMNS, store_path,
+                                           ROW_GROUP_SIZE)
+    _write_rows(mentions, MENTION_SCHEMA, mentions_path or MENTIONS_PATH)
+    articles = article_store.iter_article_rows(ARTICLE_COLUMNS, store_path,
+                                               ROW_GROUP_SIZE)
+    _write_rows(articles, ARTICLE_SCHEMA, articles_path or ARTICLES_PATH)
+
+
+def _write_rows(rows, schema, path):
+    with pq.ParquetWriter(path, schema, **WRITE_OPTIONS) as writer:
+        batch = []
+        for row in rows:
+            row["url"] = str(row["url"])
+            batch.append(row)
+            if len(batch) == ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+def read_mentions(columns=None, path=None):
+    """
+    Read one row per (candidate, article), with only the columns asked for.
+
+    Inputs:
+        columns (list of str): columns from MENTION_COLUMNS, all of them by
+            default
+        path (str): path to the parquet file, MENTIONS_PATH by default
+
+    Outputs:
+        df (dataframe): the requested columns, in the order records were
+            added to the store
+    """
+    return _read_columns(path or MENTIONS_PATH, columns or MENTION_COLUMNS)
+
+
+def read_articles(columns=None, path=None):
+    """
+    Read one row per article, with only the columns asked for.
+
+    Inputs:
+        columns (list of str): columns from ARTICLE_COLUMNS, all of them by
+            default
+        path (str): path to the parquet file, ARTICLES_PATH by default
+
+    Outputs:
+        df (dataframe): the requested columns, with articles in the order of
+            their first mention
+    """
+    return _read_columns(path or ARTICLES_PATH, columns or ARTICLE_COLUMNS)
+
+
+def _read_columns(path, columns):
+    table = pq.read_table(path, columns=columns)
+    return table.select(columns).to_pandas()
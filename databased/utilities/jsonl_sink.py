@@ -0,0 +1,353 @@
+"""
+Project: Analyzing News Coverage of Chicago's 2023 Mayoral Election
+Team: dataBased
+File Name: jsonl_sink.py
+
+Description: This module streams scraped article records to an append-only
+JSON Lines file (one JSON object per line) as they are scraped, so that a crash
+or a block partway through a run keeps everything scraped so far. A restarted
+run reopens the same file and skips the URLs already in it. Once a run
+finishes, jsonl_to_json converts the file to the JSON list format the rest of
+the project reads.
+
+Records are written in the order their articles finish downloading, each
+tagged with the position of the search match it came from. jsonl_to_json puts
+them back in match order, so the JSON file is the same as if every match had
+been scraped in turn.
+
+Both formats are also read and written a record at a time (stream_articles,
+write_json_records), so memory use does not grow with the size of the file.
+"""
+
+import os
+import re
+import json
+from itertools import chain
+
+# Number of records written between fsync checkpoints
+CHECKPOINT_EVERY = 50
+
+# Number of characters stream_json_list reads from a file at a time
+READ_CHUNK_SIZE = 1 << 16
+
+# Whitespace and commas between the items of a JSON list
+_SEPARATORS = re.compile(r"[ \t\n\r,]*")
+
+# Key of the match index each record is tagged with in the JSON Lines file
+MATCH_KEY = "_match"
+
+
+class JsonlSink:
+    """
+    An append-only JSON Lines file of scraper records.
+
+    Use as a context manager:
+
+        with JsonlSink(filepath) as sink:
+            if url not in sink.done_urls:
+                sink.write(records, match_indexes)
+
+    Attributes:
+        filepath (str): path to the JSON Lines file
+        done_urls (set): URLs of the records already in the file
+    """
+
+    def __init__(self, filepath, checkpoint_every=CHECKPOINT_EVERY):
+        self.filepath = filepath
+        self.checkpoint_every = checkpoint_every
+        self.unsynced = 0
+
+        repair_tail(filepath)
+        self.done_urls = {record["url"] for record in read_records(filepath)}
+        self.file = open(filepath, "ab", buffering=0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, records, match_indexes):
+        """
+        Append every record of one article. The records are handed to the
+        operating system in a single unbuffered write, so a crashed run never
+        leaves half of an article's records behind for a restart to mistake
+        for a finished URL.
+
+        Inputs:
+            records (list of dicts): the records to append
+            match_indexes (list of ints): for each record, the position of the
+                search match it came from, which jsonl_to_json sorts on
+        """
+        if not records:
+            return
+
+        data = "".join(json.dumps({MATCH_KEY: index, **record}) + "\n"
+                       for record, index in zip(records, match_indexes)).encode("utf-8")
+        written = 0
+        while written < len(data):
+            written += self.file.write(data[written:])
+        for record in records:
+            self.done_urls.add(record["url"])
+
+        self.unsynced += len(records)
+        if self.unsynced >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Fsync the records written so far to disk.
+        """
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        """
+        Checkpoint any remaining records and close the file.
+        """
+        if not self.file.closed:
+            self.checkpoint()
+            self.file.close()
+
+
+def repair_tail(filepath):
+    """
+    Cut off a partially written last line left behind by a crash, so that new
+    records start on a line of their own.
+
+    Inputs:
+        filepath (str): path to the JSON Lines file
+    """
+    if not os.path.exists(filepath):
+        return
+
+    with open(filepath, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+
+        # Walk back block by block to the last complete line
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def read_records(filepath):
+    """
+    Yield the records in a JSON Lines file one at a time, in file order and
+    without their match index. A partially written last line is ignored.
+
+    Inputs:
+        filepath (str): path to the JSON Lines file
+
+    Yields:
+        One record dictionary per line
+    """
+    for _, line in _read_lines(filepath):
+        record = json.loads(line)
+        record.pop(MATCH_KEY, None)
+        yield record
+
+
+def read_in_match_order(filepath):
+    """
+    Yield the records in a JSON Lines file one at a time in the order of the
+    search matches they came from, without their match index. Records of the
+    same match keep their file order, and records without a match index come
+    first.
+
+    Only the match index and position of each line are held in memory: a
+    first pass reads them, and the records are then read back one at a time
+    in sorted order.
+
+    Inputs:
+        filepath (str): path to the JSON Lines file
+
+    Yields:
+        One record dictionary per line
+    """
+    order = []
+    for offset, line in _read_lines(filepath):
+        order.append((json.loads(line).get(MATCH_KEY, -1), offset))
+    order.sort()
+
+    with open(filepath, "rb") as f:
+        for _, offset in order:
+            f.seek(offset)
+            record = json.loads(f.readline())
+            record.pop(MATCH_KEY, None)
+            yield record
+
+
+def _read_lines(filepath):
+    """
+    Yield (byte offset, line) for each complete line of a file, ignoring a
+    partially written last line.
+    """
+    if not os.path.exists(filepath):
+        return
+
+    with open(filepath, "rb") as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            yield offset, line
+            offset += len(line)
+
+
+def stream_json_list(filepath, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield the items of a JSON list file one at a time, reading the file a
+    chunk at a time instead of loading it whole.
+
+    Inputs:
+        filepath (str): path to the JSON list file
+        chunk_size (int): number of characters read at a time
+
+    Yields:
+        Each item of the list, in order
+    """
+    decoder = json.JSONDecoder()
+    with open(filepath, encoding="utf-8") as f:
+        buffer = ""
+        position = 0
+        eof = False
+        started = False
+        while True:
+            position = _SEPARATORS.match(buffer, position).end()
+            if position == len(buffer) and not eof:
+                buffer, position, eof = _read_more(f, buffer, position, chunk_size)
+                continue
+            if position == len(buffer):
+                raise ValueError(f"{filepath} ends before its JSON list does")
+
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError(f"{filepath} does not hold a JSON list")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+
+            # An item can only be decoded once all of it has been read; an
+            # item ending at the end of the buffer may continue in the file
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = len(buffer)
+            if end == len(buffer) and not eof:
+                buffer, position, eof = _read_more(f, buffer, position, chunk_size)
+                continue
+            yield item
+            position = end
+
+
+def _read_more(f, buffer, position, chunk_size):
+    """
+    Drop the part of the buffer already consumed and read more of the file,
+    at least as much as is left in the buffer so that an item larger than
+    chunk_size takes a logarithmic number of retries to decode.
+    """
+    buffer = buffer[position:]
+    more = f.read(max(chunk_size, len(buffer)))
+    return buffer + more, 0, not more
+
+
+def stream_articles(filepath):
+    """
+    Yield the article records of either a JSON list file or a JSON Lines
+    file, based on its extension, one at a time.
+
+    Inputs:
+        filepath (str): path to a .json or .jsonl file
+
+    Yields:
+        One record dictionary at a time
+    """
+    if filepath.endswith(".jsonl"):
+        return read_records(filepath)
+    return stream_json_list(filepath)
+
+
+def load_articles(filepath):
+    """
+    Load a list of article records from either a JSON list file or a JSON
+    Lines file, based on its extension.
+
+    Inputs:
+        filepath (str): path to a .json or .jsonl file
+
+    Returns:
+        A list of record dictionaries
+    """
+    return list(stream_articles(filepath))
+
+
+def jsonl_to_json(jsonl_path, json_path, append=False):
+    """
+    Convert a JSON Lines file to a JSON list file, streaming records one at a
+    time in match order (see read_in_match_order). The output has the same
+    layout as json.dump(records, f, indent=1).
+
+    Inputs:
+        jsonl_path (str): path to the JSON Lines file
+        json_path (str): path to the JSON file to write
+        append (bool): if True, keep the records already in json_path and
+            add the new ones after them
+    """
+    previous = []
+    if append and os.path.exists(json_path):
+        previous = stream_json_list(json_path)
+
+    tmp_path = json_path + ".tmp"
+    count = 0
+    with open(tmp_path, "w") as f:
+        for record in chain(previous, read_in_match_order(jsonl_path)):
+            f.write("[\n" if count == 0 else ",\n")
+            f.write(_indent(json.dumps(record, indent=1)))
+            count += 1
+        f.write("\n]" if count else "[]")
+    os.replace(tmp_path, json_path)
+
+
+def write_json_records(records, json_path):
+    """
+    Write records to a JSON list file one at a time, in the compact layout of
+    pandas' DataFrame.to_json(orient="records"): no whitespace, non-ASCII
+    characters and "/" escaped.
+
+    Inputs:
+        records (iterable of dicts): the records to write
+        json_path (str): path to the JSON file to write
+    """
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("[")
+        for count, record in enumerate(records):
+            if count:
+                f.write(",")
+            f.write(json.dumps(record, separators=(",", ":")).replace("/", "\\/"))
+        f.write("]")
+    os.replace(tmp_path, json_path)
+
+
+def _indent(text):
+    """
+    Indent every line of `text` by one space, as json.dump does for the items
+    of a list.
+    """
+    return "\n".join(" " + line for line in text.split("\n"))